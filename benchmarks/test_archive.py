@@ -0,0 +1,72 @@
+""" 字幕包解压基准测试
+    在合成的整季字幕包上计时 extract_subtitle 选择并解压一集字幕的耗时，
+    rar 字幕包需要系统中有 rar 命令才能生成 """
+
+import io
+import os
+import shutil
+import subprocess
+import zipfile
+
+import pytest
+
+from getsubtitle.archive import extract_subtitle
+from getsubtitle.utils import get_info_dict
+
+video_name = "Game.of.Thrones.S07E05.1080p.WEB.h264-TBS.mkv"
+subtitle = ("1\n00:00:01,000 --> 00:00:02,000\n凛冬将至\n\n" * 2000).encode("utf-8")
+members = [
+    "Game.of.Thrones.S07E%02d.1080p.WEB.h264-TBS.%s" % (episode, suffix)
+    for episode in range(1, 11)
+    for suffix in ("简体.srt", "繁体.srt", "简体.ass", "英文.srt")
+]
+
+
+def build_zip():
+    buff = io.BytesIO()
+    with zipfile.ZipFile(buff, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name in members:
+            zf.writestr(name, subtitle)
+    return buff.getvalue()
+
+
+def build_rar(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    for name in members:
+        (source / name).write_bytes(subtitle)
+    archive = str(tmp_path / "season.rar")
+    subprocess.check_call(
+        ["rar", "a", "-ep", "-idq", archive] + [str(source / name) for name in members]
+    )
+    with open(archive, "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("datatype", [".zip", ".rar"])
+def test_extract_subtitle(benchmark, tmp_path, datatype):
+    if datatype == ".rar":
+        if shutil.which("rar") is None:
+            pytest.skip("rar is not installed")
+        archive = build_rar(tmp_path)
+    else:
+        archive = build_zip()
+    info_dict = get_info_dict(video_name)
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+
+    extracted = benchmark(
+        extract_subtitle,
+        video_name,
+        str(out_dir),
+        "[SUBHD]Game of Thrones S07",
+        archive,
+        info_dict,
+        rename=True,
+        single=False,
+        both=True,
+        plex=False,
+    )
+    assert extracted
+    assert all("S07E05" in name for name, _ in extracted)
+    assert os.listdir(str(out_dir))
@@ -0,0 +1,42 @@
+""" 下载缓冲区基准测试
+    对比逐块 bytes 拼接与 Downloader.read_response 读取多 MB 压缩包的耗时 """
+
+import pytest
+
+from getsubtitle.downloader import Downloader
+
+archive_size = 4 * 1024 * 1024
+payload = bytes(bytearray(range(256))) * (archive_size // 256)
+
+
+class FakeResponse(object):
+    def __init__(self, data, content_length=True):
+        self.data = data
+        self.headers = {"content-length": str(len(data))} if content_length else {}
+
+    def iter_content(self, chunk_size):
+        data = self.data
+        for i in range(0, len(data), chunk_size):
+            yield data[i : i + chunk_size]
+
+
+def read_by_concatenation(response, chunk_size=1024):
+    sub_data_bytes = b""
+    for data in response.iter_content(chunk_size=chunk_size):
+        sub_data_bytes += data
+    return sub_data_bytes
+
+
+def test_bytes_concatenation(benchmark):
+    result = benchmark.pedantic(
+        read_by_concatenation, args=(FakeResponse(payload),), rounds=3
+    )
+    assert result == payload
+
+
+@pytest.mark.parametrize("chunk_size", [1024, 16 * 1024])
+def test_read_response(benchmark, chunk_size):
+    downloader = Downloader()
+    downloader.chunk_size = chunk_size
+    result = benchmark(downloader.read_response, FakeResponse(payload), "bench.zip")
+    assert result == payload
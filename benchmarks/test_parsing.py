@@ -0,0 +1,57 @@
+""" 页面解析基准测试
+    对比完整 html.parser 解析与 lxml 加 SoupStrainer 只解析所需节点时，
+    站点下载器解析搜索页与详情页的耗时。
+    测试页面在 tests/fixtures 的基础上加入导航、侧栏等无关节点，接近实际页面大小 """
+
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+from getsubtitle import parsing
+from getsubtitle.subhd import SubHDDownloader
+from getsubtitle.zimuku import ZimukuDownloader
+from getsubtitle.zimuzu import ZimuzuDownloader
+
+fixtures_dir = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures")
+keywords = ("Game of Thrones", "s07", "e01")
+
+filler_item = '<li><a href="/list/%d" class="link">分类 %d</a><span>%d</span></li>'
+filler = (
+    '<div class="nav"><ul>'
+    + "".join(filler_item % (i, i, i) for i in range(300))
+    + "</ul></div><script>var ads = [];</script>"
+)
+
+
+def read_page(name):
+    with open(os.path.join(fixtures_dir, name), encoding="utf-8") as f:
+        text = f.read()
+    return text.replace("<body>", "<body>" + filler).replace(
+        "</body>", filler + "</body>"
+    )
+
+
+pages = [
+    ("subhd_search.html", lambda d, t: d.parse_search(t, keywords), SubHDDownloader),
+    ("subhd_detail.html", lambda d, t: d.parse_dtoken(t), SubHDDownloader),
+    ("zimuzu_search.html", lambda d, t: d.parse_search(t, keywords), ZimuzuDownloader),
+    ("zimuzu_detail.html", lambda d, t: d.parse_detail(t), ZimuzuDownloader),
+    ("zimuku_search.html", lambda d, t: d.parse_search(t, keywords), ZimukuDownloader),
+    ("zimuku_detail.html", lambda d, t: d.parse_detail(t, "default"), ZimukuDownloader),
+]
+
+
+@pytest.mark.parametrize("name", [page[0] for page in pages])
+def test_full_html_parser(benchmark, name):
+    text = read_page(name)
+    benchmark(BeautifulSoup, text, "html.parser")
+
+
+@pytest.mark.parametrize("name, parse, downloader_class", pages)
+def test_site_parser(benchmark, name, parse, downloader_class):
+    if parsing.parser != "lxml":
+        pytest.skip("lxml is not installed")
+    text = read_page(name)
+    downloader = downloader_class()
+    assert benchmark(parse, downloader, text)
@@ -0,0 +1,35 @@
+""" 视频名批量预解析基准测试
+    在合成的视频名语料上对比逐个解析与进程池批量解析的耗时，
+    进程池的收益随 CPU 核心数增加 """
+
+import os
+
+import pytest
+
+from getsubtitle.utils import get_info_dict, info_cache, preparse
+
+shows = ["Game.of.Thrones", "The.Morning.Show", "Westworld", "The.Expanse"]
+corpus = [
+    "%s.S%02dE%02d.%s.WEB-DL.DD5.1.H264-%s.mkv" % (show, season, episode, size, group)
+    for show in shows
+    for season, size, group in [(1, "1080p", "NTb"), (2, "720p", "TBS")]
+    for episode in range(1, 26)
+]
+
+
+def parse_serially():
+    return [get_info_dict(name) for name in corpus]
+
+
+def parse_in_pool():
+    preparse(corpus, workers=max(os.cpu_count() or 1, 2))
+    return [get_info_dict(name) for name in corpus]
+
+
+@pytest.mark.parametrize(
+    "parse", [parse_serially, parse_in_pool], ids=["serial", "pool"]
+)
+def test_parse_corpus(benchmark, parse):
+    infos = benchmark.pedantic(parse, setup=info_cache.clear, rounds=3)
+    assert len(infos) == len(corpus)
+    assert infos[-1]["episode"] == 25
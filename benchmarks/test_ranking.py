@@ -0,0 +1,81 @@
+""" 候选字幕排序基准测试
+    在数千个候选字幕与字幕文件上，对比对每个字符串多次子串查找后整体排序，
+    与 Ranker 单次扫描加堆选取前 k 个的耗时 """
+
+import pytest
+
+from getsubtitle.models import Subtitle
+from getsubtitle.ranking import Ranker
+from getsubtitle.utils import get_info_dict
+
+video_name = "Game.of.Thrones.S07E05.1080p.WEB.h264-TBS.mkv"
+languages = ["简体", "繁体", "英文", "中英双语", "chs&eng", "cht", ""]
+candidates = [
+    Subtitle(
+        "[SUBHD]权力的游戏 第七季 第%d集 %s" % (i % 10, languages[i % 7]),
+        "Game.of.Thrones.S07E05.%s.WEB.h264-%s"
+        % (("1080p", "720p", "2160p")[i % 3], ("TBS", "AVS", "NTb", "SVA")[i % 4]),
+        None,
+        "https://subhd.tv/ar0/%d" % i,
+    )
+    for i in range(5000)
+]
+members = [
+    "Game.of.Thrones.S07/Game.of.Thrones.S07E%02d.1080p.WEB.h264-TBS.%s.%s"
+    % (i % 50, languages[i % 7] or "zh", ("srt", "ass", "ssa")[i % 3])
+    for i in range(5000)
+]
+
+
+def type_score(text):
+    type_score = 0
+    type_score += ("英文" in text) * 1
+    type_score += ("eng" in text) * 1
+    type_score += ("简体" in text) * 2
+    type_score += ("chs" in text) * 2
+    type_score += ("cht" in text) * 4
+    type_score += ("繁体" in text) * 4
+    type_score += ("中英" in text) * 8
+    return type_score
+
+
+def rank_by_substrings(subtitles, k):
+    return sorted(subtitles, key=lambda s: type_score(s.title), reverse=True)[:k]
+
+
+def member_score(name):
+    filename = name.split("/")[-1]
+    try:
+        filename = filename.encode("cp437").decode("gbk")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        pass
+    score = type_score(filename)
+    score += ("ass" in filename or "ssa" in filename) * 2
+    score += ("srt" in filename) * 1
+    return score
+
+
+def rank_members_by_substrings(names):
+    return sorted(names, key=member_score, reverse=True)[0]
+
+
+@pytest.mark.parametrize("k", [1, 5])
+def test_rank_by_substrings(benchmark, k):
+    assert len(benchmark(rank_by_substrings, candidates, k)) == k
+
+
+@pytest.mark.parametrize("k", [1, 5])
+def test_rank_subtitles(benchmark, k):
+    info_dict = get_info_dict(video_name)
+    ranked = benchmark(lambda: Ranker(info_dict).rank_subtitles(candidates, k))
+    assert len(ranked) == k
+    assert "中英双语" in ranked[0].title
+
+
+def test_rank_members_by_substrings(benchmark):
+    assert benchmark(rank_members_by_substrings, members)
+
+
+def test_rank_members(benchmark):
+    best = benchmark(lambda: next(Ranker().iter_members(members)))
+    assert best[0] == 10
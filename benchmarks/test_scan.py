@@ -0,0 +1,58 @@
+""" 视频库扫描基准测试
+    对比 os.walk 加列表拼接查找与 scanner.scan_videos 扫描合成目录树的耗时 """
+
+import os
+
+import pytest
+
+from getsubtitle.constants import sub_format_list, video_format_list
+from getsubtitle.scanner import scan_videos
+
+seasons, episodes = 20, 100
+
+
+@pytest.fixture(scope="module")
+def library(tmp_path_factory):
+    root = tmp_path_factory.mktemp("library")
+    for season in range(seasons):
+        season_dir = root / "Show" / ("Season %02d" % season)
+        os.makedirs(str(season_dir))
+        for episode in range(episodes):
+            name = "Show.S%02dE%02d.1080p.WEB-DL" % (season, episode)
+            open(str(season_dir / (name + ".mkv")), "w").close()
+            if episode % 2:
+                open(str(season_dir / (name + ".zh.srt")), "w").close()
+    return str(root)
+
+
+def scan_by_concatenation(mix_str, store_path_files=()):
+    store_path_files = list(store_path_files)
+    video_dict = {}
+    for root, dirs, files in os.walk(mix_str):
+        for one_name in files:
+            suffix = os.path.splitext(one_name)[1]
+            if suffix not in video_format_list:
+                continue
+            v_name_no_format = os.path.splitext(one_name)[0]
+            sub_exists = max(
+                int(
+                    v_name_no_format + sub_type in files + store_path_files
+                    or v_name_no_format + ".zh" + sub_type in files + store_path_files
+                )
+                for sub_type in sub_format_list
+            )
+            video_dict[one_name] = {"path": root, "have_subtitle": sub_exists}
+    return video_dict
+
+
+def test_walk_concatenation(benchmark, library):
+    video_dict = benchmark(scan_by_concatenation, library)
+    assert len(video_dict) == seasons * episodes
+
+
+def test_scan_videos(benchmark, library):
+    video_dict = benchmark(scan_videos, library)
+    assert len(video_dict) == seasons * episodes
+    assert sum(v["have_subtitle"] for v in video_dict.values()) == (
+        seasons * episodes // 2
+    )
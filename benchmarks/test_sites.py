@@ -0,0 +1,49 @@
+""" 站点搜索基准测试
+    用 tests/fixtures 中录制的页面代替网络请求，计时各下载器 get_subtitles 的页面解析与结果合并 """
+
+import os
+
+import pytest
+
+from getsubtitle.subhd import SubHDDownloader
+from getsubtitle.utils import get_info_dict, get_keywords
+from getsubtitle.zimuku import ZimukuDownloader
+from getsubtitle.zimuzu import ZimuzuDownloader
+
+fixtures_dir = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures")
+info_dict = get_info_dict("Game.of.Thrones.S07E01.1080p.WEB.h264-TBS.mkv")
+keywords = tuple(get_keywords(info_dict))
+
+
+class RecordedResponse(object):
+    def __init__(self, text):
+        self.text = text
+
+
+class RecordedSession(object):
+
+    """ 每个请求都返回同一个录制页面 """
+
+    def __init__(self, page):
+        with open(os.path.join(fixtures_dir, page), encoding="utf-8") as f:
+            self.response = RecordedResponse(f.read())
+
+    def get(self, url, **kwargs):
+        return self.response
+
+
+@pytest.mark.parametrize(
+    "downloader_class, page",
+    [
+        (SubHDDownloader, "subhd_search.html"),
+        (ZimuzuDownloader, "zimuzu_search.html"),
+        (ZimukuDownloader, "zimuku_search.html"),
+    ],
+    ids=["subhd", "zimuzu", "zimuku"],
+)
+def test_get_subtitles(benchmark, downloader_class, page):
+    downloader = downloader_class(session=RecordedSession(page))
+    sub_dict = benchmark(
+        downloader.get_subtitles, keywords, sub_num=2, info_dict=info_dict
+    )
+    assert len(sub_dict) == 2
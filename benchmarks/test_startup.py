@@ -0,0 +1,61 @@
+""" 启动耗时基准测试
+    在子进程中以 -X importtime 导入命令行入口，记录启动耗时，
+    并检查启动时没有导入只在搜索、下载时才需要的模块 """
+
+import subprocess
+import sys
+
+import pytest
+
+# 启动时不应导入的模块
+lazy_modules = [
+    "guessit",
+    "requests",
+    "bs4",
+    "lxml",
+    "archi",
+    "aiohttp",
+    "getsubtitle.subhd",
+    "getsubtitle.zimuzu",
+    "getsubtitle.zimuku",
+]
+
+
+def import_times(statement):
+
+    """ 返回 {模块名: 累计导入耗时（微秒）} """
+
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    ).stderr
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_main_imports_lazily():
+    times = import_times("import getsubtitle.main")
+    assert "getsubtitle.main" in times
+    assert [name for name in lazy_modules if name in times] == []
+
+
+@pytest.mark.parametrize(
+    "args",
+    [["-c", "import getsubtitle.main"], ["-m", "getsubtitle.main", "--version"]],
+    ids=["import", "version"],
+)
+def test_startup(benchmark, args):
+    benchmark.pedantic(
+        subprocess.run,
+        args=([sys.executable] + args,),
+        kwargs={"stdout": subprocess.DEVNULL, "check": True},
+        rounds=10,
+    )
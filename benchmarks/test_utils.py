@@ -0,0 +1,67 @@
+""" 视频名解析与字幕匹配基准测试
+    get_info_dict 分别在缓存未命中与命中时计时，
+    video_match 与 get_best_subtitle 在数百个候选名称上计时 """
+
+import pytest
+
+from getsubtitle.utils import (
+    get_best_subtitle,
+    get_info_dict,
+    get_keywords,
+    info_cache,
+    video_match,
+)
+
+video_name = "Game.of.Thrones.S07E05.1080p.WEB.h264-TBS.mkv"
+candidates = [
+    "Game.of.Thrones.S07E%02d.%s.WEB.h264-TBS" % (episode, quality)
+    for episode in range(1, 51)
+    for quality in ("1080p", "720p", "2160p", "480p")
+]
+members = [
+    "Game.of.Thrones.S07/Game.of.Thrones.S07E%02d.1080p.WEB.h264-TBS.%s"
+    % (episode, suffix)
+    for episode in range(1, 101)
+    for suffix in ("简体.srt", "繁体.srt", "简体.ass", "英文.srt", "chs&eng.ass")
+]
+
+
+def test_get_info_dict_uncached(benchmark):
+    info_dict = benchmark(lambda: (info_cache.clear(), get_info_dict(video_name))[1])
+    assert info_dict["episode"] == 5
+
+
+def test_get_info_dict_cached(benchmark):
+    get_info_dict(video_name)
+    info_dict = benchmark(get_info_dict, video_name)
+    assert info_dict["episode"] == 5
+
+
+def test_get_keywords(benchmark):
+    info_dict = get_info_dict(video_name)
+    keywords = benchmark(get_keywords, info_dict)
+    assert keywords[0] == "Game of Thrones s07"
+
+
+@pytest.mark.parametrize("cached", [False, True], ids=["uncached", "cached"])
+def test_video_match(benchmark, cached):
+    info_dict = get_info_dict(video_name)
+    if cached:
+        for candidate in candidates:
+            get_info_dict(candidate)
+
+    def match_all():
+        if not cached:
+            info_cache.clear()
+        return [c for c in candidates if video_match(c, info_dict)]
+
+    matched = benchmark.pedantic(match_all, rounds=1 if not cached else 20)
+    assert len(matched) == 4
+
+
+def test_get_best_subtitle(benchmark):
+    info_dict = get_info_dict(video_name)
+    for member in members:
+        get_info_dict(member)
+    best = benchmark(get_best_subtitle, members, info_dict)
+    assert "S07E05" in best
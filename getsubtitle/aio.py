@@ -0,0 +1,397 @@
+# coding: utf-8
+
+from __future__ import print_function
+
+import asyncio
+import atexit
+import threading
+from collections import OrderedDict as order_dict
+from urllib.parse import urljoin
+
+from requests import exceptions
+
+from .downloader import DownloadBuffer, SearchBlocked, SearchRejected
+from .metrics import metrics
+from .models import SubtitleFile
+from .progress_bar import ProgressBar
+from .ratelimit import throttle_status
+from .subhd import SubHDDownloader
+from .sys_global_var import prefix
+from .zimuku import ZimukuDownloader
+from .zimuzu import ZimuzuDownloader
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+
+""" asyncio 字幕下载后端
+    在一个事件循环中完成所有搜索与下载，各站点通过信号量限制并发数。
+    搜索关键字序列和页面解析与同步下载器共用。
+"""
+
+
+def require_aiohttp():
+
+    """ 未安装 aiohttp 时抛出带安装提示的 RuntimeError """
+
+    if aiohttp is None:
+        raise RuntimeError(
+            "asyncio backend requires aiohttp, "
+            "install it with 'pip install getsubtitle[async]'"
+        )
+
+
+def create_session(limit=100, limit_per_host=8):
+
+    """ 创建共用的 aiohttp 会话，需在事件循环中调用 """
+
+    require_aiohttp()
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host)
+    )
+
+
+class AsyncDownloader(object):
+
+    concurrency = 4  # 单个站点同时进行的请求数
+
+    def __init__(self, session, concurrency=None, cache=None):
+        super(AsyncDownloader, self).__init__(cache, session)
+        self.semaphore = asyncio.Semaphore(concurrency or self.concurrency)
+
+    async def wait(self):
+
+        """ 从站点的令牌桶取得令牌，等待期间不阻塞其他站点的请求 """
+
+        delay = self.bucket.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def on_response(self, response):
+
+        """ 记录请求数，根据响应状态调整站点的请求速率 """
+
+        metrics.inc("requests", self.name)
+        if response.status in throttle_status:
+            self.bucket.throttled()
+        else:
+            self.bucket.succeeded()
+
+    async def fetch(self, method, url, timeout=10, headers=None, **kwargs):
+
+        """ 发送请求，返回响应内容字节数据 """
+
+        await self.wait()
+        async with self.semaphore:
+            async with self.session.request(
+                method,
+                url,
+                headers=headers or self.headers,
+                timeout=aiohttp.ClientTimeout(total=timeout),
+                **kwargs
+            ) as response:
+                self.on_response(response)
+                return await response.read()
+
+    async def get_text(self, url, timeout=10, headers=None):
+        await self.wait()
+        async with self.semaphore:
+            async with self.session.get(
+                url,
+                headers=headers or self.headers,
+                timeout=aiohttp.ClientTimeout(total=timeout),
+            ) as response:
+                self.on_response(response)
+                return await response.text()
+
+    async def download(self, url, file_name, headers=None):
+
+        """ 下载压缩包，返回压缩包字节数据，响应头 """
+
+        await self.wait()
+        async with self.semaphore:
+            async with self.session.get(url, headers=headers or self.headers) as r:
+                self.on_response(r)
+                content_size = r.content_length
+                if content_size:
+                    bar = ProgressBar(prefix + " Get", file_name.strip(), content_size)
+                else:
+                    bar = ProgressBar(prefix + " Get", file_name.strip())
+                buff = DownloadBuffer()
+                try:
+                    async for data in r.content.iter_chunked(self.chunk_size):
+                        buff.write(data)
+                        if content_size:
+                            bar.refresh(buff.size)
+                        else:
+                            bar.point_wait()
+                    if not content_size:
+                        bar.point_wait(end=True)
+                    metrics.inc("bytes", self.name, buff.size)
+                    return buff.getvalue(), r.headers
+                finally:
+                    bar.close()
+
+    async def search(self, keyword, keywords, info_dict=None):
+
+        """ 搜索单个关键字，返回 [(字幕名, 字幕信息)]，
+            多次重试后仍为验证页面时返回None """
+
+        cache_key = self.get_cache_key(keyword, keywords, info_dict)
+        if self.cache is not None:
+            results = self.cache.get(self.name, cache_key)
+            if results is not None:
+                metrics.inc("search_cache_hits", self.name)
+                return results
+            metrics.inc("search_cache_misses", self.name)
+        for _ in range(self.max_retries + 1):
+            with metrics.timer("search", self.name):
+                text = await self.get_text(self.get_search_url(keyword))
+                results = self.parse_search(text, keywords, info_dict)
+            if results is not None:
+                break
+            # 出现验证页面，降低请求速率后重试
+            self.bucket.throttled()
+            metrics.inc("retries", self.name)
+        else:
+            print(prefix + " [%s] too many verification pages, skipped." % self.name)
+            return None
+        if self.cache is not None:
+            self.cache.set(self.name, cache_key, results)
+        return results
+
+    async def resolve_subtitles(self, subtitles):
+        pass
+
+    async def download_subtitle(self, subtitle):
+        result = await self.download_file(subtitle.title, subtitle.link)
+        if result[1] is None:
+            return None
+        return SubtitleFile(*result[:2])
+
+    async def get_subtitles(
+        self, keywords, sub_num=None, stop_event=None, info_dict=None
+    ):
+
+        """ 与同步下载器的 get_subtitles 相同，返回候选字幕列表 """
+
+        print(prefix + " Searching %s..." % self.name, end="\r")
+
+        sub_num = sub_num or self.default_sub_num
+        sub_dict = order_dict()
+        blocked = False
+        ladder = self.get_keyword_ladder(keywords, info_dict)
+        if self.parallel_ladder:
+            # 同时搜索所有关键字，按顺序合并结果
+            tasks = [
+                asyncio.ensure_future(self.search(keyword, keywords, info_dict))
+                for keyword in ladder
+            ]
+        else:
+            tasks = []
+        try:
+            for i, keyword in enumerate(ladder):
+                if stop_event is not None and stop_event.is_set():
+                    break  # 搜索已被取消
+                if tasks:
+                    results = await tasks[i]
+                else:
+                    results = await self.search(keyword, keywords, info_dict)
+                if results is None:
+                    blocked = True
+                    continue
+                for sub_name, payload in results:
+                    if sub_name not in sub_dict:
+                        sub_dict[sub_name] = self.make_subtitle(sub_name, payload)
+                    if len(sub_dict) >= sub_num:
+                        break
+                if len(sub_dict) >= sub_num:
+                    break  # 字幕条数达到上限
+        except SearchRejected:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        subtitles = self.post_process(list(sub_dict.values()), stop_event)
+        if blocked and not subtitles:
+            raise SearchBlocked(self.name)
+        return subtitles
+
+
+class AsyncSubHDDownloader(AsyncDownloader, SubHDDownloader):
+    async def download_subtitle(self, subtitle):
+        result = await self.download_file(subtitle.title, subtitle.link)
+        return self.check_download(*result)
+
+    async def download_file(self, file_name, sub_url):
+        sid = sub_url.split("/")[-1]
+        dtoken = self.parse_dtoken(await self.get_text(sub_url))
+        for _ in range(self.max_retries + 1):
+            content = await self.fetch(
+                "POST",
+                self.site_url + "/ajax/down_ajax",
+                data={"sub_id": sid, "dtoken": dtoken},
+            )
+            download_link = self.parse_down_ajax(content)
+            if download_link is not None:
+                break
+            # 下载过于频繁，降低请求速率后重试
+            self.bucket.throttled()
+            metrics.inc("retries", self.name)
+        else:
+            return None, None, "false"
+        try:
+            sub_data_bytes, _ = await self.download(download_link, file_name)
+        except asyncio.TimeoutError:
+            return None, None, "false"
+        return self.guess_datatype(download_link), sub_data_bytes, "success"
+
+
+class AsyncZimuzuDownloader(AsyncDownloader, ZimuzuDownloader):
+    async def download_file(self, file_name, sub_url):
+        download_link = self.parse_detail(await self.get_text(sub_url))
+        headers = dict(self.headers, Referer=download_link)
+        text = await self.get_text(self.get_api_url(download_link), headers=headers)
+        download_link = self.parse_api(text)
+        try:
+            sub_data_bytes, _ = await self.download(download_link, file_name)
+        except asyncio.TimeoutError:
+            return None, None
+        return self.guess_datatype(download_link, file_name), sub_data_bytes
+
+
+class AsyncZimukuDownloader(AsyncDownloader, ZimukuDownloader):
+    async def resolve(self, subtitle):
+
+        """ 解析字幕详情页与下载页，补全字幕语言值与下载链接，返回下载链接 """
+
+        if subtitle.resolved:
+            return subtitle.data["download_link"]
+        sub_type = subtitle.data["type"]
+        with metrics.timer("resolve", self.name):
+            text = await self.get_text(subtitle.link, timeout=60)
+            lan, download_link = self.parse_detail(text, sub_type)
+            if sub_type == "default":
+                download_link = urljoin(self.site_url, download_link)
+                text = await self.get_text(download_link, timeout=60)
+                download_link = urljoin(self.site_url, self.parse_download_page(text))
+        subtitle.data["download_link"] = download_link
+        subtitle.lan = lan
+        return download_link
+
+    async def resolve_subtitles(self, subtitles):
+        await asyncio.gather(
+            *[self.resolve(subtitle) for subtitle in subtitles if not subtitle.resolved]
+        )
+
+    def post_process(self, subtitles, stop_event=None):
+        # 候选字幕在被选中或需要显示语言值时再解析
+        return subtitles
+
+    async def download_subtitle(self, subtitle):
+        download_link = await self.resolve(subtitle)
+        result = await self.download_file(subtitle.title, download_link)
+        if result[1] is None:
+            return None
+        return SubtitleFile(*result[:2])
+
+    async def download_file(self, file_name, download_link, session=None):
+        headers = dict(self.headers, Referer=download_link)
+        try:
+            sub_data_bytes, response_headers = await self.download(
+                download_link, file_name, headers=headers
+            )
+        except asyncio.TimeoutError:
+            return None, None, "false"
+        filename = response_headers["Content-Disposition"]
+        return self.guess_datatype("", filename), sub_data_bytes
+
+
+class SyncDownloader(object):
+
+    """ 将异步下载器包装为同步接口，供 GetSubtitles 使用 """
+
+    def __init__(self, backend, downloader):
+        self.backend = backend
+        self.downloader = downloader
+
+    def get_subtitles(self, keywords, sub_num=None, stop_event=None, info_dict=None):
+        subtitles = self.backend.run(
+            self.downloader.get_subtitles(
+                keywords, sub_num, stop_event=stop_event, info_dict=info_dict
+            )
+        )
+        # 候选字幕的解析与下载经由包装对象提交到事件循环
+        for subtitle in subtitles:
+            subtitle.source = self
+        return subtitles
+
+    def resolve_subtitles(self, subtitles):
+        return self.backend.run(self.downloader.resolve_subtitles(subtitles))
+
+    def download_subtitle(self, subtitle):
+        return self.backend.run(self.downloader.download_subtitle(subtitle))
+
+    def download_file(self, *args, **kwargs):
+        return self.backend.run(self.downloader.download_file(*args, **kwargs))
+
+
+class AsyncBackend(object):
+
+    """ 在后台线程运行事件循环，多个工作线程可同时向其提交搜索与下载 """
+
+    downloader_classes = {
+        "subhd": AsyncSubHDDownloader,
+        "zimuzu": AsyncZimuzuDownloader,
+        "zimuku": AsyncZimukuDownloader,
+    }
+
+    def __init__(self, concurrency=None, cache=None):
+        # 在启动事件循环前检查依赖，网络异常的转换也需要 aiohttp
+        require_aiohttp()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.session = None
+        self.concurrency, self.cache = concurrency, cache
+        self.downloaders = {}  # 首次使用时创建
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    async def _create_downloader(self, name):
+        if self.session is None:
+            self.session = create_session()
+        return self.downloader_classes[name](self.session, self.concurrency, self.cache)
+
+    def run(self, coro):
+
+        """ 在事件循环中运行协程并等待结果，
+            网络异常转换为 requests 的异常以兼容同步下载器的错误处理 """
+
+        async def wrapper():
+            try:
+                return await coro
+            except asyncio.TimeoutError as e:
+                raise exceptions.Timeout(str(e))
+            except aiohttp.ClientConnectionError as e:
+                raise exceptions.ConnectionError(str(e))
+
+        return asyncio.run_coroutine_threadsafe(wrapper(), self.loop).result()
+
+    def get_downloader(self, name):
+        with self._lock:
+            if name not in self.downloaders:
+                self.downloaders[name] = self.run(self._create_downloader(name))
+        return SyncDownloader(self, self.downloaders[name])
+
+    def close(self):
+        if self.loop.is_closed():
+            return
+        if self.session is not None:
+            self.run(self.session.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
@@ -1,5 +1,6 @@
 import os
 import os.path
+from collections import OrderedDict
 from io import BytesIO
 
 import archi
@@ -9,6 +10,27 @@ from .sys_global_var import prefix
 from .utils import get_best_subtitle
 
 
+def list_members(sub_data_b):
+
+    """ 返回压缩包内的文件名列表，不解压文件内容 """
+
+    return [entry.filename for entry in archi.Archive(BytesIO(sub_data_b))]
+
+
+def read_members(sub_data_b, member_names):
+
+    """ 只解压指定的文件，返回 {文件名: 字节数据} """
+
+    member_names = set(member_names)
+    files = {}
+    for entry in archi.Archive(BytesIO(sub_data_b)):
+        if entry.filename in member_names:
+            files[entry.filename] = entry.read()
+            if len(files) == len(member_names):
+                break
+    return files
+
+
 def extract_subtitle(
     v_name,
     v_path,
@@ -21,17 +43,16 @@ def extract_subtitle(
     plex,
     delete=True,
 ):
-    """ 接受下载好的字幕包字节数据， 猜测字幕并解压。 """
+    """ 接受下载好的字幕包字节数据， 猜测字幕并解压。
+        先读取文件列表挑选字幕，只解压选中的字幕文件。 """
 
-    sub_buff = BytesIO(sub_data_b)
-    ar = archi.Archive(sub_buff)
-    files = {a.filename: a.read() for a in ar}
+    member_names = list_members(sub_data_b)
 
     if not single:
-        sub_name = get_best_subtitle(files.keys(), v_info_d)
+        sub_name = get_best_subtitle(member_names, v_info_d)
     else:
         print(prefix)
-        for i, single_subtitle in enumerate(files.keys()):
+        for i, single_subtitle in enumerate(member_names):
             single_subtitle = single_subtitle.split("/")[-1]
             try:
                 # zipfile: Historical ZIP filename encoding
@@ -42,7 +63,7 @@ def extract_subtitle(
             info = " %3s)  %s" % (str(i + 1), single_subtitle)
             print(prefix + info)
 
-        indexes = range(len(files.keys()))
+        indexes = range(len(member_names))
         choice = None
         while not choice:
             try:
@@ -54,26 +75,40 @@ def extract_subtitle(
             if not choice - 1 in indexes:
                 print(prefix + "  Error: numbers not within the range")
                 choice = None
-        sub_name = list(files.keys())[choice - 1]
+        sub_name = member_names[choice - 1]
 
     if not sub_name:  # 自动模式下无最佳猜测
         return None
 
-    os.chdir(v_path)  # 切换到视频所在文件夹
+    to_extract_subs = subtitles_to_extract(sub_name, member_names, both)
+    files = read_members(sub_data_b, [one_sub for one_sub, _ in to_extract_subs])
+    save_subtitles(v_name, v_path, to_extract_subs, files, rename, plex, delete)
+    return to_extract_subs
+
+
+def subtitles_to_extract(sub_name, member_names, both):
+
+    """ 返回需要解压的 [[字幕文件名, 字幕格式]]，
+        both 为 True 时加入同名的另一种格式的字幕 """
 
-    v_name_without_format = os.path.splitext(v_name)[0]
-    # video_name + sub_type
-    to_extract_types = []
     sub_title, sub_type = os.path.splitext(sub_name)
     to_extract_subs = [[sub_name, sub_type]]
     if both:
         another_sub_type = ".srt" if sub_type == ".ass" else ".ass"
         another_sub = sub_name.replace(sub_type, another_sub_type)
-        if another_sub in files:
+        if another_sub in member_names:
             to_extract_subs.append([another_sub, another_sub_type])
         else:
             print(prefix + " no %s subtitles in this archive" % another_sub_type)
+    return to_extract_subs
+
+
+def save_subtitles(v_name, v_path, to_extract_subs, files, rename, plex, delete):
+
+    """ 将解压出的字幕保存到视频所在文件夹，files 为 {文件名: 字节数据} """
 
+    # 字幕保存在视频所在文件夹，不切换工作目录以便多线程下载
+    v_name_without_format = os.path.join(v_path, os.path.splitext(v_name)[0])
     if delete:
         for one_sub_type in sub_format_list:  # 删除若已经存在的字幕
             if os.path.exists(v_name_without_format + one_sub_type):
@@ -88,8 +123,31 @@ def extract_subtitle(
             else:
                 sub_new_name = v_name_without_format + one_sub_type
         else:
-            sub_new_name = one_sub
+            sub_new_name = os.path.join(v_path, one_sub)
         with open(sub_new_name, "wb") as sub:  # 保存字幕
-            sub.write(files[sub_name])
+            sub.write(files[one_sub])
 
-    return to_extract_subs
+
+def extract_season(videos, sub_data_b, rename, both, plex, delete=True):
+
+    """ 整季字幕包：读取一次文件列表，按季数、集数为每个视频挑选字幕，
+        再一次解压所有选中的字幕文件。
+        videos 为 [(视频名, 字幕保存路径, 视频信息)]，
+        返回与 videos 一一对应的解压字幕列表，没有匹配字幕的视频为 None """
+
+    member_names = list_members(sub_data_b)
+    chosen = OrderedDict()  # {视频序号: 需要解压的字幕}
+    for i, (v_name, v_path, v_info_d) in enumerate(videos):
+        sub_name = get_best_subtitle(member_names, v_info_d, quiet=i > 0)
+        if sub_name:
+            chosen[i] = subtitles_to_extract(sub_name, member_names, both)
+    if not chosen:
+        return [None] * len(videos)
+
+    files = read_members(
+        sub_data_b, [one_sub for subs in chosen.values() for one_sub, _ in subs],
+    )
+    for i, to_extract_subs in chosen.items():
+        v_name, v_path, _ = videos[i]
+        save_subtitles(v_name, v_path, to_extract_subs, files, rename, plex, delete)
+    return [chosen.get(i) for i in range(len(videos))]
@@ -0,0 +1,175 @@
+# coding: utf-8
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+""" 搜索结果缓存
+    以 (站点, 搜索关键字) 为键在本地 sqlite 数据库中保存解析后的搜索结果，
+    超过有效期的结果视为未命中，条目数超过上限时淘汰最久未使用的结果。
+    没有找到字幕的视频另行记录，按指数退避推迟再次搜索。
+"""
+
+
+def get_cache_dir():
+
+    """ 返回本地缓存目录，遵循 XDG_CACHE_HOME """
+
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    cache_dir = os.path.join(cache_home, "getsubtitle")
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+class SearchCache(object):
+    def __init__(self, path=None, ttl=3600, max_entries=10000):
+        self.path = path or os.path.join(get_cache_dir(), "search.sqlite3")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS search ("
+                "site TEXT, keyword TEXT, results TEXT, "
+                "created REAL, accessed REAL, PRIMARY KEY (site, keyword))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS search_accessed ON search (accessed)"
+            )
+
+    def get(self, site, keyword):
+
+        """ 返回缓存的搜索结果 [(字幕名, 字幕信息)]，未命中或已过期时返回None """
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, created FROM search WHERE site = ? AND keyword = ?",
+                (site, keyword),
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE search SET accessed = ? WHERE site = ? AND keyword = ?",
+                    (now, site, keyword),
+                )
+            self.hits += 1
+        return [tuple(one) for one in json.loads(row[0])]
+
+    def set(self, site, keyword, results):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search VALUES (?, ?, ?, ?, ?)",
+                (site, keyword, json.dumps(results), now, now),
+            )
+            self._evict()
+
+    def _evict(self):
+        # 删除过期条目，再按最近使用时间淘汰超出上限的条目
+        self._conn.execute(
+            "DELETE FROM search WHERE created < ?", (time.time() - self.ttl,)
+        )
+        self._conn.execute(
+            "DELETE FROM search WHERE rowid IN ("
+            "SELECT rowid FROM search ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM search").fetchone()[0]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM search")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class NegativeCache(object):
+
+    """ 记录没有找到字幕的搜索，按指数退避推迟下一次搜索
+        第 n 次失败后 backoff * 2 ** (n - 1) 秒内不再搜索，间隔不超过 max_backoff 秒 """
+
+    def __init__(self, path=None, backoff=3600, max_backoff=7 * 24 * 3600):
+        self.path = path or os.path.join(get_cache_dir(), "negative.sqlite3")
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS negative ("
+                "keyword TEXT PRIMARY KEY, failures INTEGER, reason TEXT, "
+                "failed REAL, retry REAL)"
+            )
+
+    def get(self, keyword, now=None):
+
+        """ 仍在退避期内时返回 {'failures', 'reason', 'retry'}，否则返回None """
+
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT failures, reason, retry FROM negative WHERE keyword = ?",
+                (keyword,),
+            ).fetchone()
+        if row is None or row[2] <= now:
+            return None
+        self.skipped += 1
+        return {"failures": row[0], "reason": row[1], "retry": row[2]}
+
+    def failed(self, keyword, reason, now=None):
+
+        """ 记录一次失败，返回下一次搜索的时间 """
+
+        now = time.time() if now is None else now
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT failures FROM negative WHERE keyword = ?", (keyword,)
+            ).fetchone()
+            failures = (row[0] if row else 0) + 1
+            delay = min(self.backoff * 2 ** (failures - 1), self.max_backoff)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO negative VALUES (?, ?, ?, ?, ?)",
+                (keyword, failures, reason, now, now + delay),
+            )
+        return now + delay
+
+    def succeeded(self, keyword):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM negative WHERE keyword = ?", (keyword,))
+
+    def backing_off(self, now=None):
+
+        """ 返回仍在退避期内的搜索数 """
+
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM negative WHERE retry > ?",
+                (time.time() if now is None else now,),
+            ).fetchone()[0]
+
+    def stats(self):
+        return {"skipped": self.skipped, "backing_off": self.backing_off()}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
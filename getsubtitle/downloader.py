@@ -0,0 +1,267 @@
+# coding: utf-8
+
+from __future__ import print_function
+
+from collections import OrderedDict as order_dict
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import metrics
+from .models import Subtitle, SubtitleFile
+from .progress_bar import ProgressBar
+from .ratelimit import get_bucket
+from .sessions import create_session
+from .sys_global_var import prefix
+
+
+""" 字幕下载器基类
+    子类提供搜索地址与页面解析，搜索流程由基类实现，同步与异步下载器共用解析逻辑
+"""
+
+
+class SearchBlocked(Exception):
+
+    """ 站点持续返回验证页面，没有得到任何搜索结果，稍后可以重试 """
+
+
+class SearchRejected(Exception):
+
+    """ 站点拒绝了搜索关键字，更宽泛的关键字同样会被拒绝，停止搜索 """
+
+
+class DownloadBuffer(object):
+
+    """ 下载缓冲区
+        数据追加到可增长的 bytearray 中，总复制量与数据大小呈线性关系。
+        压缩包最终以字节数据解压、保存，不转存到临时文件 """
+
+    def __init__(self):
+        self.size = 0
+        self._buff = bytearray()
+
+    def write(self, data):
+        self.size += len(data)
+        self._buff += data
+
+    def getvalue(self):
+        return bytes(self._buff)
+
+
+class Downloader(object):
+
+    name = ""  # 站点名，用于字幕名前缀及提示信息
+    default_sub_num = 5
+    rate = 4.0  # 每秒请求数上限，遇到限流时自动降低
+    burst = 8  # 允许短时间内连续发送的请求数
+    max_retries = 3  # 遇到验证页面或限流响应时的最大重试次数
+    chunk_size = 16 * 1024  # 下载时单次读取的最大字节数
+    parallel_ladder = False  # 同时搜索关键字序列中的所有关键字
+
+    def __init__(self, cache=None, session=None):
+        self.cache = cache  # 搜索结果缓存 SearchCache
+        self.headers = {
+            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_9_5)\
+                            AppleWebKit 537.36 (KHTML, like Gecko) Chrome",
+            "Accept-Language": "zh-CN,zh;q=0.8",
+            "Accept": "text/html,application/xhtml+xml,\
+                        application/xml;q=0.9,image/webp,*/*;q=0.8",
+        }
+        # 同一站点的所有下载器共用一个令牌桶
+        self.bucket = get_bucket(self.name, self.rate, self.burst)
+        # 运行期间复用的连接池会话
+        if session is None:
+            session = create_session(self.headers, bucket=self.bucket, site=self.name)
+        self.session = session
+        self.site_url = ""
+        self.search_url = ""
+
+    def get_keyword_ladder(self, keywords, info_dict=None):
+
+        """ 传入重要度降序的关键字列表，
+            返回由具体到宽泛、每次去掉最后一个关键字的搜索关键字序列 """
+
+        keywords = list(keywords)
+        keyword = ""
+        for one in keywords:
+            keyword += one + " "
+        ladder = [keyword]
+        while len(keywords) > 1:
+            keyword = keyword.replace(keywords[-1], "")
+            keywords.pop(-1)
+            ladder.append(keyword)
+        return ladder
+
+    def get_search_url(self, keyword):
+        return self.search_url + keyword
+
+    def get_cache_key(self, keyword, keywords, info_dict=None):
+
+        """ 返回搜索缓存的键，parse_search 按视频信息过滤结果的下载器
+            需要把过滤条件加入键中 """
+
+        return keyword
+
+    def parse_search(self, text, keywords, info_dict=None):
+
+        """ 解析搜索结果页面，返回 [(字幕名, 字幕信息)]，
+            页面需要验证、应当稍后重试时返回None，
+            站点拒绝关键字时抛出 SearchRejected """
+
+        raise NotImplementedError
+
+    def make_subtitle(self, sub_name, payload):
+
+        """ 由搜索结果构造候选字幕 """
+
+        return Subtitle(
+            sub_name,
+            payload.get("version", sub_name),
+            payload.get("lan"),
+            payload["link"],
+            self,
+        )
+
+    def post_process(self, subtitles, stop_event=None):
+
+        """ 搜索结束后整理候选字幕，如排序、解析下载链接 """
+
+        return subtitles
+
+    def resolve_subtitles(self, subtitles):
+
+        """ 补全尚未解析的候选字幕，默认搜索结果已包含全部信息 """
+
+    def download_subtitle(self, subtitle):
+
+        """ 下载候选字幕的字幕包，返回 SubtitleFile，下载失败时返回 None """
+
+        datatype, sub_data_bytes = self.download_file(subtitle.title, subtitle.link)[:2]
+        if sub_data_bytes is None:
+            return None
+        return SubtitleFile(datatype, sub_data_bytes)
+
+    def search(self, session, keyword, keywords, info_dict=None):
+
+        """ 搜索单个关键字，返回 [(字幕名, 字幕信息)]，
+            多次重试后仍为验证页面时返回None """
+
+        cache_key = self.get_cache_key(keyword, keywords, info_dict)
+        if self.cache is not None:
+            results = self.cache.get(self.name, cache_key)
+            if results is not None:
+                metrics.inc("search_cache_hits", self.name)
+                return results
+            metrics.inc("search_cache_misses", self.name)
+        for _ in range(self.max_retries + 1):
+            with metrics.timer("search", self.name):
+                r = session.get(self.get_search_url(keyword), timeout=10)
+                results = self.parse_search(r.text, keywords, info_dict)
+            if results is not None:
+                break
+            # 出现验证页面，降低请求速率后重试
+            self.bucket.throttled()
+            metrics.inc("retries", self.name)
+        else:
+            print(prefix + " [%s] too many verification pages, skipped." % self.name)
+            return None
+        if self.cache is not None:
+            self.cache.set(self.name, cache_key, results)
+        return results
+
+    def get_subtitles(self, keywords, sub_num=None, stop_event=None, info_dict=None):
+
+        """ 传入关键字列表，返回候选字幕 Subtitle 列表。
+                keywords: 重要度降序的关键字列表
+                sub_num: 字幕结果数
+                stop_event: 被设置时停止继续搜索
+                info_dict: 视频的解析信息，避免下载器重复解析
+            没有找到字幕且有关键字因验证页面被跳过时抛出 SearchBlocked """
+
+        print(prefix + " Searching %s..." % self.name, end="\r")
+
+        sub_num = sub_num or self.default_sub_num
+        sub_dict = order_dict()
+        blocked = False
+        ladder = self.get_keyword_ladder(keywords, info_dict)
+        ladder_results = self.iter_ladder(ladder, keywords, info_dict)
+        try:
+            for results in ladder_results:
+                if stop_event is not None and stop_event.is_set():
+                    break  # 搜索已被取消
+                if results is None:
+                    blocked = True
+                    continue
+                for sub_name, payload in results:
+                    if sub_name not in sub_dict:
+                        sub_dict[sub_name] = self.make_subtitle(sub_name, payload)
+                    if len(sub_dict) >= sub_num:
+                        break
+                if len(sub_dict) >= sub_num:
+                    break  # 字幕条数达到上限
+        except SearchRejected:
+            pass
+        finally:
+            ladder_results.close()
+        subtitles = self.post_process(list(sub_dict.values()), stop_event)
+        if blocked and not subtitles:
+            raise SearchBlocked(self.name)
+        return subtitles
+
+    def iter_ladder(self, ladder, keywords, info_dict=None):
+
+        """ 按由具体到宽泛的顺序返回每个关键字的搜索结果。
+            parallel_ladder 模式下同时发起所有搜索，停止迭代时取消未完成的搜索 """
+
+        if not self.parallel_ladder or len(ladder) < 2:
+            for keyword in ladder:
+                yield self.search(self.session, keyword, keywords, info_dict)
+            return
+
+        executor = ThreadPoolExecutor(max_workers=len(ladder))
+        futures = [
+            executor.submit(self.search, self.session, keyword, keywords, info_dict)
+            for keyword in ladder
+        ]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def read_response(self, response, file_name):
+
+        """ 流式读取压缩包响应并显示进度，返回字节数据 """
+
+        content_size = int(response.headers.get("content-length") or 0)
+        if content_size:
+            bar = ProgressBar(prefix + " Get", file_name.strip(), content_size)
+        else:
+            bar = ProgressBar(prefix + " Get", file_name.strip())
+        buff = DownloadBuffer()
+        try:
+            for data in response.iter_content(chunk_size=self.chunk_size):
+                buff.write(data)
+                if content_size:
+                    bar.refresh(buff.size)
+                else:
+                    bar.point_wait()
+            if not content_size:
+                bar.point_wait(end=True)
+            metrics.inc("bytes", self.name, buff.size)
+            return buff.getvalue()
+        finally:
+            bar.close()
+
+    @staticmethod
+    def guess_datatype(download_link, file_name=""):
+
+        """ 根据下载链接或文件名猜测压缩包类型 """
+
+        for datatype in [".rar", ".zip", ".7z"]:
+            if datatype[1:] in download_link:
+                return datatype
+        for datatype in [".rar", ".zip", ".7z"]:
+            if datatype in file_name:
+                return datatype
+        return "Unknown"
@@ -6,30 +6,75 @@ import argparse
 import os
 import re
 import sys
+import threading
+import time
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from traceback import format_exc
 
-import chardet
-import pkg_resources
-from guessit import guessit
-from requests import exceptions
-
-from .archive import extract_subtitle
-from .constants import (
-    sub_format_list,
-    supportted_compression_extension,
-    video_format_list,
-)
-from .subhd import SubHDDownloader
+from . import ratelimit, registry
+from .cache import NegativeCache, SearchCache
+from .constants import sub_format_list, supportted_compression_extension
+from .metrics import metrics
+from .output import ThreadBufferedStream
+from .ranking import Ranker
+from .scanner import scan_videos
+from .state import LibraryState
+from .store import ArchiveStore
 from .sys_global_var import prefix
-from .utils import get_info_dict, get_keywords, get_type_score, video_match
-from .zimuku import ZimukuDownloader
-from .zimuzu import ZimuzuDownloader
+from .utils import (
+    get_info_dict,
+    get_keywords,
+    info_cache,
+    preparse,
+    season_match,
+    video_match,
+)
+
+""" 启动时只导入命令行解析与本地状态所需的模块，
+    guessit、requests、bs4、archi 及各站点下载器在第一次用到时才导入，
+    视频均已有字幕时不会导入任何站点依赖。
+"""
+
+
+def get_version():
+    try:
+        from importlib.metadata import PackageNotFoundError, version
+    except ImportError:  # Python < 3.8
+        try:
+            from importlib_metadata import PackageNotFoundError, version
+        except ImportError:
+            return "dev"
+    try:
+        return version("getsubtitle")
+    except PackageNotFoundError:
+        return "dev"
+
+
+class VersionAction(argparse.Action):
+
+    """ 只在传入 --version 时查询安装的版本 """
+
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, help=None):
+        super(VersionAction, self).__init__(
+            option_strings, dest, default=argparse.SUPPRESS, nargs=0, help=help
+        )
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        sys.stdout.write("%s %s\n" % (parser.prog, get_version()))
+        parser.exit()
+
+
+def get_site(sub_name):
 
-try:
-    __version__ = pkg_resources.get_distribution("getsubtitle").version
-except pkg_resources.DistributionNotFound:
-    __version__ = "dev"
+    """ 字幕名以 [站点] 开头，返回与下载器 name 一致的站点名 """
+
+    site = sub_name[1 : sub_name.index("]")]
+    return {"ZMZ": "ZIMUZU"}.get(site, site)
+
+
+def format_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
 
 
 class GetSubtitles(object):
@@ -52,6 +97,19 @@ class GetSubtitles(object):
         sub_num,
         downloader,
         sub_path,
+        jobs=1,
+        backend="requests",
+        cache_ttl=3600,
+        cache_size=10000,
+        archive_store_size=200,
+        parallel_ladder=False,
+        rescan=False,
+        retry_backoff=3600,
+        retry_backoff_max=7 * 24 * 3600,
+        metrics_json=None,
+        metrics_prom=None,
+        parse_workers=0,
+        season_pack=False,
     ):
         self.arg_name = name
         self.sub_store_path = sub_path
@@ -64,27 +122,94 @@ class GetSubtitles(object):
             self.sub_num = int(sub_num)
         self.plex = plex
         self.debug = debug
-        self.s_error = ""
-        self.f_error = ""
-        self.subhd = SubHDDownloader()
-        self.zimuzu = ZimuzuDownloader()
-        self.zimuku = ZimukuDownloader()
+        self.jobs = max(int(jobs or 1), 1)
+        if self.jobs > 1 and (self.query or self.single):
+            print("interactive mode can't run in parallel, fall back to --jobs 1")
+            self.jobs = 1
+        self.season_pack = season_pack
+        if self.season_pack and (self.query or self.single):
+            print("interactive mode can't share season packs, fall back to per video")
+            self.season_pack = False
+        self._season_done = set()  # 已从整季字幕包中得到字幕的视频
+        if archive_store_size:
+            self.archive_store = ArchiveStore(max_size=archive_store_size * 1024 * 1024)
+        else:
+            self.archive_store = None
+        self.metrics_json = metrics_json
+        self.metrics_prom = metrics_prom
+        self.parse_workers = parse_workers
+        # 重新扫描时仍记录本次的处理结果
+        self.rescan = rescan
+        self.library_state = LibraryState()
+        if retry_backoff:
+            self.negative_cache = NegativeCache(
+                backoff=retry_backoff, max_backoff=retry_backoff_max
+            )
+        else:
+            self.negative_cache = None
+        if cache_ttl:
+            self.search_cache = SearchCache(ttl=cache_ttl, max_entries=cache_size)
+        else:
+            self.search_cache = None
+        if backend == "asyncio":
+            # 缺少 aiohttp 时立即报错，事件循环线程在第一次创建下载器时才启动，
+            # 预解析视频名的进程池在此之前创建
+            from .aio import require_aiohttp
+
+            require_aiohttp()
+        self.backend_name = backend
+        self.backend = None  # 所有下载器共用一个事件循环，各站点单独限制并发数
         if not downloader:
-            self.downloader = [self.subhd, self.zimuzu, self.zimuku]
-        elif downloader == "subhd":
-            self.downloader = [self.subhd]
-        elif downloader == "zimuzu":
-            self.downloader = [self.zimuzu]
-        elif downloader == "zimuku":
-            self.downloader = [self.zimuku]
+            self.downloader_names = registry.names()
+        elif downloader in registry.downloaders:
+            self.downloader_names = [downloader]
         else:
-            print(
+            raise ValueError(
                 "no such downloader, "
-                "please choose from 'subhd','zimuzu' and 'zimuku'"
+                "please choose from %s" % ",".join(map(repr, registry.names()))
             )
-            # print("no such downloader, please choose from 'zimuzu' and 'zimuku'")
+        self.parallel_ladder = parallel_ladder
+        self._downloaders = {}  # 已创建的下载器
+        self._downloaders_lock = threading.Lock()
         self.failed_list = []  # [{'name', 'path', 'error', 'trace_back'}
 
+    def get_downloader(self, name):
+
+        """ 返回站点下载器，第一次使用时才导入并创建 """
+
+        with self._downloaders_lock:
+            downloader = self._downloaders.get(name)
+            if downloader is None:
+                if self.backend_name == "asyncio":
+                    if self.backend is None:
+                        from .aio import AsyncBackend
+
+                        self.backend = AsyncBackend(cache=self.search_cache)
+                    downloader = self.backend.get_downloader(name)
+                else:
+                    downloader = registry.load_class(name)(cache=self.search_cache)
+                if self.parallel_ladder:
+                    # 异步后端的同步包装对象需设置在被包装的下载器上
+                    getattr(downloader, "downloader", downloader).parallel_ladder = True
+                self._downloaders[name] = downloader
+            return downloader
+
+    @property
+    def downloader(self):
+        return [self.get_downloader(name) for name in self.downloader_names]
+
+    @property
+    def subhd(self):
+        return self.get_downloader("subhd")
+
+    @property
+    def zimuzu(self):
+        return self.get_downloader("zimuzu")
+
+    @property
+    def zimuku(self):
+        return self.get_downloader("zimuku")
+
     def get_path_name(self, mix_str, store_path):
 
         """ 传入输入的视频名称或路径,
@@ -93,62 +218,17 @@ class GetSubtitles(object):
 
         mix_str = mix_str.replace('"', "")
         store_path = (store_path or "").replace('"', "")
-        store_path_files = []
         if not os.path.isdir(store_path):
             print("no valid path specfied,download sub file to video file location.")
             store_path = ""
-        else:
-            for root, dirs, files in os.walk(store_path):
-                store_path_files.extend(files)
         video_dict = OrderedDict()
         if os.path.isdir(mix_str):  # 一个文件夹
-            for root, dirs, files in os.walk(mix_str):
-                for one_name in files:
-                    suffix = os.path.splitext(one_name)[1]
-                    # 检查后缀是否为视频格式
-                    if suffix not in video_format_list:
-                        continue
-                    v_name_no_format = os.path.splitext(one_name)[0]
-                    sub_exists = max(
-                        list(
-                            map(
-                                lambda sub_type: int(
-                                    v_name_no_format + sub_type
-                                    in files + store_path_files
-                                    or v_name_no_format + ".zh" + sub_type
-                                    in files + store_path_files
-                                ),
-                                sub_format_list,
-                            )
-                        )
-                    )
-                    video_dict[one_name] = {
-                        "path": next(
-                            item
-                            for item in [store_path, os.path.abspath(root)]
-                            if item != ""
-                        ),
-                        "have_subtitle": sub_exists,
-                    }
+            video_dict = scan_videos(mix_str, store_path)
 
         elif os.path.isabs(mix_str):  # 视频绝对路径
-            v_path, v_name = os.path.split(mix_str)
-            v_name_no_format = os.path.splitext(v_name)[0]
-            if os.path.isdir(store_path):
-                s_path = os.path.abspath(store_path)
-            else:
-                s_path = v_path
-            sub_exists = max(
-                list(
-                    map(
-                        lambda sub_type: os.path.exists(
-                            os.path.join(s_path, v_name_no_format + sub_type)
-                        ),
-                        sub_format_list,
-                    )
-                )
+            video_dict[os.path.basename(mix_str)] = self.get_video_info(
+                mix_str, store_path
             )
-            video_dict[v_name] = {"path": s_path, "have_subtitle": sub_exists}
         else:  # 单个视频名字，无路径
             if not os.path.isdir(store_path):
                 video_dict[mix_str] = {"path": os.getcwd(), "have_subtitle": 0}
@@ -159,33 +239,66 @@ class GetSubtitles(object):
                 }
         return video_dict
 
-    def choose_subtitle(self, sub_dict):
+    def get_video_info(self, video_path, store_path):
+
+        """ 传入视频绝对路径，返回 {'path', 'have_subtitle', 'video_path'} """
+
+        v_path, v_name = os.path.split(video_path)
+        v_name_no_format = os.path.splitext(v_name)[0]
+        if os.path.isdir(store_path):
+            s_path = os.path.abspath(store_path)
+        else:
+            s_path = v_path
+        sub_exists = max(
+            list(
+                map(
+                    lambda sub_type: os.path.exists(
+                        os.path.join(s_path, v_name_no_format + sub_type)
+                    ),
+                    sub_format_list,
+                )
+            )
+        )
+        return {"path": s_path, "have_subtitle": sub_exists, "video_path": video_path}
+
+    def resolve_subtitles(self, subtitles):
+
+        """ 按下载器分组并发解析被延迟解析的候选字幕（zimuku）的语言值 """
+
+        pending = OrderedDict()
+        for subtitle in subtitles:
+            if not subtitle.resolved:
+                pending.setdefault(subtitle.source, []).append(subtitle)
+        for source, group in pending.items():
+            source.resolve_subtitles(group)
 
-        """ 传入候选字幕字典
-            若为查询模式返回选择的字幕包名称，字幕包下载地址
-            否则返回字幕字典第一个字幕包的名称，字幕包下载地址 """
+    def choose_subtitle(self, subtitles, ranker):
+
+        """ 传入候选字幕列表与视频的排序器
+            若为查询模式返回选择的候选字幕列表
+            否则返回只包含得分最高的候选字幕的列表，字幕在下载时才解析 """
 
         if not self.query:
-            chosen_sub = list(sub_dict.keys())[0]
-            link = sub_dict[chosen_sub]["link"]
-            session = sub_dict[chosen_sub].get("session", None)
-            return [[chosen_sub, link, session]]
-
-        for i, key in enumerate(sub_dict.keys()):
-            if i == self.sub_num:
-                break
+            return ranker.rank_subtitles(subtitles, 1)
+
+        # 显示语言信息前并发解析需要显示的字幕，解析后按语言值重新排序
+        shown = ranker.rank_subtitles(subtitles, self.sub_num)
+        self.resolve_subtitles(shown)
+        shown = ranker.rank_subtitles(shown)
+        for i, subtitle in enumerate(shown):
+            lan = subtitle.lan or 0
             lang_info = ""
-            lang_info += "【简】" if 4 & sub_dict[key]["lan"] else "      "
-            lang_info += "【繁】" if 2 & sub_dict[key]["lan"] else "      "
-            lang_info += "【英】" if 1 & sub_dict[key]["lan"] else "      "
-            lang_info += "【双】" if 8 & sub_dict[key]["lan"] else "      "
-            a_sub_info = " %3s) %s  %s" % (i + 1, lang_info, key)
+            lang_info += "【简】" if 4 & lan else "      "
+            lang_info += "【繁】" if 2 & lan else "      "
+            lang_info += "【英】" if 1 & lan else "      "
+            lang_info += "【双】" if 8 & lan else "      "
+            a_sub_info = " %3s) %s  %s" % (i + 1, lang_info, subtitle.title)
             a_sub_info = prefix + a_sub_info
-            if "version" in sub_dict[key]:
-                a_sub_info += f"({sub_dict[key]['version']})"
+            if subtitle.version not in subtitle.title:
+                a_sub_info += f"({subtitle.version})"
             print(a_sub_info)
 
-        indexes = range(len(sub_dict.keys()))
+        indexes = range(len(shown))
         choices = None
         chosen_subs = []
         while not choices:
@@ -201,41 +314,58 @@ class GetSubtitles(object):
                     print(prefix + "  Error: choice %d not within the range" % choice)
                     choices.remove(choice)
                 else:
-                    chosen_sub = list(sub_dict.keys())[choice - 1]
-                    link = sub_dict[chosen_sub]["link"]
-                    session = sub_dict[chosen_sub].get("session", None)
-                    chosen_subs.append([chosen_sub, link, session])
+                    chosen_subs.append(shown[choice - 1])
         return chosen_subs
 
+    def download_archive(self, subtitle):
+
+        """ 下载字幕包，返回压缩包类型，压缩包字节数据，下载失败时返回None
+            已下载过的字幕包直接从本地存储读取，不再解析字幕页面 """
+
+        from requests import exceptions
+
+        if self.archive_store is not None:
+            archive = self.archive_store.get(subtitle.link)
+            if archive is not None:
+                print(prefix + " Get '%s' from local store" % subtitle.title.strip())
+                metrics.inc("archive_store_hits")
+                return archive
+        try:
+            with metrics.timer("download", get_site(subtitle.title)):
+                subtitle_file = subtitle.download()
+        except (exceptions.Timeout, exceptions.ConnectionError):
+            print(prefix + " connect timeout, failed to download this archive.")
+            return None
+        if subtitle_file is None:
+            return None
+        datatype, sub_data_bytes = subtitle_file
+        if self.archive_store is not None and sub_data_bytes:
+            self.archive_store.put(subtitle.link, datatype, sub_data_bytes)
+        return datatype, sub_data_bytes
+
     def process_archive(
         self,
         video_filename,
         video_info,
-        sub_choice,
-        link,
-        session,
+        subtitle,
         info_dict,
         rename=True,
         delete=True,
+        peers=(),
     ):
+
+        """ 下载并解压字幕包，peers 为同季的其他视频 [(视频名, 视频信息)]，
+            字幕包中与其集数一致的字幕在同一次解压中一并保存 """
+
+        from .archive import extract_season, extract_subtitle
+
+        sub_choice = subtitle.title
         if self.query:
             print(prefix + " ")
-        if "[ZMZ]" in sub_choice:
-            datatype, sub_data_bytes = self.zimuzu.download_file(sub_choice, link)
-        elif "[SUBHD]" in sub_choice:
-            datatype, sub_data_bytes, msg = self.subhd.download_file(sub_choice, link)
-            if msg == "false":
-                print(
-                    prefix + " error: "
-                    "download too frequently "
-                    "with subhd downloader, "
-                    "please change to other downloaders"
-                )
-                return
-        elif "[ZIMUKU]" in sub_choice:
-            datatype, sub_data_bytes = self.zimuku.download_file(
-                sub_choice, link, session=session
-            )
+        archive = self.download_archive(subtitle)
+        if archive is None:
+            return None
+        datatype, sub_data_bytes = archive
         extract_sub_names = []
 
         if self.save_original:  # 保存原字幕压缩包
@@ -243,25 +373,47 @@ class GetSubtitles(object):
                 archive_new_name = video_filename + datatype
             else:
                 archive_new_name = sub_choice + datatype
+            archive_new_name = os.path.join(video_info["path"], archive_new_name)
             with open(archive_new_name, "wb") as f:
                 f.write(sub_data_bytes)
             print(prefix + " save original file.")
         # 获得猜测字幕名称
         # 查询模式必有返回值，自动模式无猜测值返回None
-        extract_sub_names = extract_subtitle(
-            video_filename,
-            video_info["path"],
-            sub_choice,
-            sub_data_bytes,
-            info_dict,
-            rename,
-            self.single,
-            self.both,
-            self.plex,
-            delete=delete,
-        )
-        if not extract_sub_names:
-            return None
+        peers = self.season_peers(peers)
+        with metrics.timer("extract"):
+            if peers:
+                videos = [(video_filename, video_info["path"], info_dict)]
+                for peer_filename, peer_info in peers:
+                    videos.append(
+                        (peer_filename, peer_info["path"], get_info_dict(peer_filename))
+                    )
+                extracted = extract_season(
+                    videos, sub_data_bytes, rename, self.both, self.plex, delete=delete
+                )
+                extract_sub_names = extracted[0]
+            else:
+                extract_sub_names = extract_subtitle(
+                    video_filename,
+                    video_info["path"],
+                    sub_choice,
+                    sub_data_bytes,
+                    info_dict,
+                    rename,
+                    self.single,
+                    self.both,
+                    self.plex,
+                    delete=delete,
+                )
+        if extract_sub_names:
+            self.print_extracted(extract_sub_names)
+        if peers:
+            # 当前视频没有匹配的字幕时，同季其他视频的字幕也已保存
+            for (peer_filename, peer_info), peer_sub_names in zip(peers, extracted[1:]):
+                if peer_sub_names:
+                    self.finish_peer(peer_filename, peer_info, subtitle, peer_sub_names)
+        return extract_sub_names or []
+
+    def print_extracted(self, extract_sub_names):
         for extract_sub_name, extract_sub_type in extract_sub_names:
             extract_sub_name = extract_sub_name.split("/")[-1]
             try:
@@ -274,111 +426,403 @@ class GetSubtitles(object):
                 print(prefix + " " + extract_sub_name)
             except UnicodeDecodeError:
                 print(prefix + " " + extract_sub_name.encode("gbk"))
-        return extract_sub_names
 
-    def start(self):
+    @staticmethod
+    def video_key(video_filename, video_info):
+        return video_info.get("video_path") or os.path.join(
+            video_info["path"], video_filename
+        )
 
-        all_video_dict = self.get_path_name(self.arg_name, self.sub_store_path)
+    def season_peers(self, peers):
 
-        for video_filename, video_info in all_video_dict.items():
+        """ 返回同季的其他视频中仍需要下载字幕的视频 """
 
-            self.s_error = ""  # 重置错误记录
-            self.f_error = ""
+        return [
+            (peer_filename, peer_info)
+            for peer_filename, peer_info in peers
+            if self.video_key(peer_filename, peer_info) not in self._season_done
+            and not (peer_info["have_subtitle"] and not self.over)
+            and not self.check_library_state(peer_info, count=False)[1]
+        ]
 
-            try:
-                info_dict = get_info_dict(video_filename)
-                keywords = get_keywords(info_dict)
-                print("\n" + prefix + " " + video_filename)  # 打印当前视频及其路径
-                print(prefix + " " + video_info["path"] + "\n" + prefix)
+    def finish_peer(self, video_filename, video_info, subtitle, extract_sub_names):
 
-                if video_info["have_subtitle"] and not self.over:
-                    print(prefix + " subtitle already exists, add '-o' to replace it.")
-                    continue
+        """ 记录从整季字幕包中得到字幕的视频，之后处理到该视频时直接跳过 """
 
-                sub_dict = OrderedDict()
-                for i, downloader in enumerate(self.downloader):
-                    try:
-                        subtitles = downloader.get_subtitles(tuple(keywords))
-                        for subtitle_name, payload in subtitles.items():
-                            subtitle_version = payload.get("version", subtitle_name)
-                            if not video_match(subtitle_version, info_dict):
-                                continue
-                            else:
-                                sub_dict[subtitle_name] = payload
-                    except ValueError as e:
-                        if str(e) == "Zimuku搜索结果出现未知结构页面":
-                            print(prefix + " warn: " + str(e))
-                        else:
-                            raise (e)
-                    except (exceptions.Timeout, exceptions.ConnectionError):
-                        print(prefix + " connect timeout, search next site.")
-                        if i < (len(self.downloader) - 1):
+        self._season_done.add(self.video_key(video_filename, video_info))
+        metrics.inc("season_pack_videos")
+        print("\n" + prefix + " " + video_filename)
+        print(prefix + " " + video_info["path"] + "\n" + prefix)
+        print(prefix + " from season pack '%s'" % subtitle.title.strip())
+        self.print_extracted(extract_sub_names)
+
+        info_dict = get_info_dict(video_filename)
+        if self.negative_cache is not None:
+            self.negative_cache.succeeded(" ".join(get_keywords(info_dict)))
+        video_path = video_info.get("video_path")
+        self.library_state.record(
+            video_path,
+            self.library_state.stat(video_path) if video_path else None,
+            "success",
+            info=info_dict,
+            subtitle=subtitle.title,
+            site=get_site(subtitle.title),
+        )
+
+    def group_seasons(self, video_dict):
+
+        """ 按剧名与季数将视频分组，组内按集数排列，
+            电影及无法识别季数、集数的视频各自成组，返回 [[(视频名, 视频信息)]] """
+
+        groups = OrderedDict()
+        for video_filename, video_info in video_dict.items():
+            info_dict = get_info_dict(video_filename)
+            season, episode = info_dict.get("season"), info_dict.get("episode")
+            if isinstance(season, int) and isinstance(episode, int):
+                key = (info_dict["title"].lower(), season)
+            else:
+                key = video_filename
+            groups.setdefault(key, []).append((episode, video_filename, video_info))
+        video_groups = []
+        for key, group in groups.items():
+            if isinstance(key, tuple):
+                group.sort(key=lambda one: one[0])
+            video_groups.append(
+                [
+                    (video_filename, video_info)
+                    for _, video_filename, video_info in group
+                ]
+            )
+        return video_groups
+
+    def search_subtitles(self, keywords, info_dict):
+
+        """ 同时向所有下载器发起搜索，按下载器优先级合并匹配视频的字幕，
+            优先级靠前的结果数达到 sub_num 后取消其余搜索，
+            没有匹配的字幕且有站点连接失败或被验证页面拦截时返回 None """
+
+        from requests import exceptions
+
+        from .downloader import SearchBlocked
+
+        # 整季模式下同时保留整季字幕包
+        match = season_match if self.season_pack else video_match
+        matched = []
+        timeouts = 0  # 连接失败的站点数
+        unavailable = 0  # 连接失败或被验证页面拦截的站点数
+        stop_event = threading.Event()
+        downloaders = self.downloader
+        # 并发处理视频时，搜索线程的输出写入当前视频的缓冲区
+        wrap = getattr(sys.stdout, "wrap", lambda fn: fn)
+        executor = ThreadPoolExecutor(max_workers=len(downloaders))
+        futures = [
+            executor.submit(
+                wrap(downloader.get_subtitles),
+                tuple(keywords),
+                stop_event=stop_event,
+                info_dict=info_dict,
+            )
+            for downloader in downloaders
+        ]
+        try:
+            for future in futures:
+                try:
+                    subtitles = future.result()
+                    for subtitle in subtitles or []:
+                        if not match(subtitle.version, info_dict):
                             continue
                         else:
-                            print(prefix + " PLEASE CHECK YOUR NETWORK STATUS")
-                            sys.exit(0)
-                    if len(sub_dict) >= self.sub_num:
-                        break
-                if not sub_dict:
-                    self.s_error += "no search results. "
+                            matched.append(subtitle)
+                except ValueError as e:
+                    if str(e) == "Zimuku搜索结果出现未知结构页面":
+                        print(prefix + " warn: " + str(e))
+                    else:
+                        raise (e)
+                except SearchBlocked:
+                    unavailable += 1
+                    continue
+                except (exceptions.Timeout, exceptions.ConnectionError):
+                    print(prefix + " connect timeout, search next site.")
+                    timeouts += 1
+                    unavailable += 1
                     continue
+                if len(matched) >= self.sub_num:
+                    break
+        finally:
+            # 取消尚未完成的搜索
+            stop_event.set()
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+        if timeouts == len(downloaders):
+            print(prefix + " PLEASE CHECK YOUR NETWORK STATUS")
+        if unavailable and not matched:
+            return None
+        return matched
 
-                extract_sub_names = []
-
-                # 遍历字幕包直到有猜测字幕
-                while not extract_sub_names and sub_dict:
-                    sub_choices = self.choose_subtitle(sub_dict)
-                    for i, choice in enumerate(sub_choices):
-                        sub_choice, link, session = choice
-                        sub_dict.pop(sub_choice)
-                        if i == 0:
-                            n_extract_sub_names = self.process_archive(
-                                video_filename,
-                                video_info,
-                                sub_choice,
-                                link,
-                                session,
-                                info_dict,
-                            )
-                        else:
-                            n_extract_sub_names = self.process_archive(
-                                video_filename,
-                                video_info,
-                                sub_choice,
-                                link,
-                                session,
-                                info_dict,
-                                rename=False,
-                                delete=False,
-                            )
-                        if not n_extract_sub_names:
-                            print(prefix + " no matched subtitle in this archive")
-                            continue
-                        else:
-                            extract_sub_names += n_extract_sub_names
-            finally:
-                if (
-                    "extract_sub_names" in dir()
-                    and not extract_sub_names
-                    and len(sub_dict) == 0
-                ):
-                    # 自动模式下所有字幕包均没有猜测字幕
-                    self.s_error += " failed to guess one subtitle,"
-                    self.s_error += "use '-q' to try query mode."
-
-                if self.s_error and not self.debug:
-                    self.s_error += "add --debug to get more info of the error"
-
-                if self.s_error:
-                    self.failed_list.append(
-                        {
-                            "name": video_filename,
-                            "path": video_info["path"],
-                            "error": self.s_error,
-                            "trace_back": self.f_error,
-                        }
+    def check_library_state(self, video_info, count=True):
+
+        """ 返回视频文件状态，以及视频是否未变化且已完成、可以跳过 """
+
+        video_path = video_info.get("video_path")
+        stat = self.library_state.stat(video_path) if video_path else None
+        finished = (
+            stat is not None
+            and video_info["have_subtitle"]
+            and not (self.over or self.rescan)
+            and self.library_state.is_finished(video_path, stat, count)
+        )
+        return stat, finished
+
+    def preparse_videos(self, video_dict):
+
+        """ 在主循环之前用进程池批量解析需要处理的视频名，结果放入 info_cache """
+
+        names = [
+            video_filename
+            for video_filename, video_info in video_dict.items()
+            if not self.check_library_state(video_info, count=False)[1]
+        ]
+        with metrics.timer("preparse"):
+            parsed = preparse(names, self.parse_workers)
+        if parsed and self.debug:
+            print("pre-parsed %s video names\n" % parsed)
+
+    def process_video(self, video_filename, video_info, peers=()):
+
+        """ 搜索、下载并解压单个视频的字幕，失败时记录到 failed_list
+            视频库状态中未变化且已完成的视频，以及已从整季字幕包中得到字幕的视频直接跳过
+            peers 为同季的其他视频，自动模式下下载的字幕包同时用于这些视频 """
+
+        if self.video_key(video_filename, video_info) in self._season_done:
+            return
+        video_path = video_info.get("video_path")
+        stat, finished = self.check_library_state(video_info)
+        if finished:
+            return
+
+        s_error = ""
+        f_error = ""
+        outcome = None
+        download_failed = False  # 有字幕包下载失败，结果不能说明没有字幕
+        info_dict = None
+        chosen_sub = None
+        negative_key = None
+        missed = None  # 没有找到字幕的原因
+        retry = None
+
+        try:
+            with metrics.timer("guessit"):
+                info_dict = get_info_dict(video_filename)
+            keywords = get_keywords(info_dict)
+            print("\n" + prefix + " " + video_filename)  # 打印当前视频及其路径
+            print(prefix + " " + video_info["path"] + "\n" + prefix)
+
+            if video_info["have_subtitle"] and not self.over:
+                print(prefix + " subtitle already exists, add '-o' to replace it.")
+                outcome = "exists"
+                return
+
+            negative_key = " ".join(keywords)
+            if self.negative_cache is not None and not (self.query or self.rescan):
+                backoff = self.negative_cache.get(negative_key)
+                if backoff is not None:
+                    # 之前的搜索没有找到字幕，退避期内不再搜索
+                    retry = backoff["retry"]
+                    s_error += "%s (%s times), next search after %s. " % (
+                        backoff["reason"],
+                        backoff["failures"],
+                        format_time(retry),
                     )
-                    print(prefix + " error:" + self.s_error)
+                    return
+
+            subtitles = self.search_subtitles(keywords, info_dict)
+            if subtitles is None:
+                # 网络错误与验证页面不计入退避，下次运行时重新搜索
+                s_error += "search failed, some sites are unavailable (network "
+                s_error += "error or verification pages), try again later. "
+                return
+            if not subtitles:
+                s_error += "no search results. "
+                missed = "no search results"
+                return
+
+            extract_sub_names = []
+            ranker = Ranker(info_dict)
+
+            # 遍历字幕包直到有猜测字幕
+            while not extract_sub_names and subtitles:
+                candidates = subtitles
+                if self.season_pack:
+                    # 优先下载整季字幕包
+                    candidates = [
+                        subtitle
+                        for subtitle in subtitles
+                        if not video_match(subtitle.version, info_dict)
+                    ] or subtitles
+                sub_choices = self.choose_subtitle(candidates, ranker)
+                for i, subtitle in enumerate(sub_choices):
+                    subtitles.remove(subtitle)
+                    if i == 0:
+                        n_extract_sub_names = self.process_archive(
+                            video_filename, video_info, subtitle, info_dict, peers=peers
+                        )
+                    else:
+                        n_extract_sub_names = self.process_archive(
+                            video_filename,
+                            video_info,
+                            subtitle,
+                            info_dict,
+                            rename=False,
+                            delete=False,
+                        )
+                    if n_extract_sub_names is None:
+                        download_failed = True
+                        continue
+                    elif not n_extract_sub_names:
+                        print(prefix + " no matched subtitle in this archive")
+                        continue
+                    else:
+                        extract_sub_names += n_extract_sub_names
+                        chosen_sub = chosen_sub or subtitle.title
+            if extract_sub_names:
+                outcome = "success"
+        finally:
+            if "extract_sub_names" in dir() and not extract_sub_names and not subtitles:
+                if download_failed:
+                    # 下载失败（网络错误、下载过于频繁）不计入退避
+                    s_error += " failed to download subtitles, try again later."
+                else:
+                    # 自动模式下所有字幕包均没有猜测字幕
+                    s_error += " failed to guess one subtitle,"
+                    s_error += "use '-q' to try query mode."
+                    missed = "failed to guess one subtitle"
+
+            if self.negative_cache is not None and negative_key is not None:
+                if missed:
+                    retry = self.negative_cache.failed(negative_key, missed)
+                    s_error += " next search after %s. " % format_time(retry)
+                elif outcome == "success":
+                    self.negative_cache.succeeded(negative_key)
+
+            if s_error and not self.debug:
+                s_error += "add --debug to get more info of the error"
+
+            if s_error:
+                self.failed_list.append(
+                    {
+                        "name": video_filename,
+                        "path": video_info["path"],
+                        "error": s_error,
+                        "trace_back": f_error,
+                        "retry": retry,
+                    }
+                )
+                print(prefix + " error:" + s_error)
+                outcome = "failed"
+
+            if outcome is not None and stat is not None:
+                self.library_state.record(
+                    video_path,
+                    stat,
+                    outcome,
+                    info=info_dict,
+                    subtitle=chosen_sub,
+                    site=get_site(chosen_sub) if chosen_sub else None,
+                    error=s_error,
+                )
+
+    def process_videos(self, videos):
+
+        """ 依次处理一组视频，整季模式下每个视频的字幕包同时用于组内之后的视频 """
+
+        for i, (video_filename, video_info) in enumerate(videos):
+            self.process_video(video_filename, video_info, peers=videos[i + 1 :])
+
+    def _process_videos_buffered(self, videos):
+        with sys.stdout.buffered():
+            self.process_videos(videos)
+
+    def process_path(self, video_path):
+
+        """ 处理监视模式中写入完成的单个视频，
+            出错时记录到 failed_list 并继续监视 """
+
+        store_path = (self.sub_store_path or "").replace('"', "")
+        if not os.path.isdir(store_path):
+            store_path = ""
+        video_filename = os.path.basename(video_path)
+        try:
+            self.process_video(
+                video_filename, self.get_video_info(video_path, store_path)
+            )
+        except Exception as e:
+            error = "%s: %s" % (type(e).__name__, e)
+            self.failed_list.append(
+                {
+                    "name": video_filename,
+                    "path": os.path.dirname(video_path),
+                    "error": error,
+                    "trace_back": format_exc(),
+                    "retry": None,
+                }
+            )
+            print(prefix + " error:" + error)
+            if self.debug:
+                print(format_exc())
+
+    def watch(self, settle=10, interval=5):
+
+        """ 处理文件夹中已有的视频后持续监视文件夹，处理新写入的视频，
+            下载器、会话与各缓存在监视期间保持复用，Ctrl+C 退出 """
+
+        from .watch import create_watcher, watch as watch_folder
+
+        # 先开始监视再处理已有视频，处理期间写入完成的视频不会遗漏
+        watcher = create_watcher(self.arg_name, interval)
+        try:
+            result = self.start()
+            print("watching %s for new videos, press Ctrl+C to exit..." % self.arg_name)
+            try:
+                watch_folder(self, watcher, settle, interval)
+            except KeyboardInterrupt:
+                pass
+        finally:
+            watcher.close()
+        return result
+
+    def start(self):
+
+        all_video_dict = self.get_path_name(self.arg_name, self.sub_store_path)
+        if self.parse_workers != 1 and len(all_video_dict) > 1:
+            self.preparse_videos(all_video_dict)
+
+        if self.season_pack:
+            # 同一季的视频在同一线程中依次处理，共用下载的整季字幕包
+            groups = self.group_seasons(all_video_dict)
+        else:
+            groups = [[item] for item in all_video_dict.items()]
+
+        if self.jobs > 1 and len(groups) > 1:
+            # 并发处理视频，按线程缓冲输出
+            stdout = sys.stdout
+            sys.stdout = ThreadBufferedStream(stdout)
+            try:
+                with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                    futures = [
+                        executor.submit(self._process_videos_buffered, videos)
+                        for videos in groups
+                    ]
+                    for future in futures:
+                        future.result()
+            finally:
+                sys.stdout = stdout
+            # 失败列表按视频顺序排列
+            order = {name: i for i, name in enumerate(all_video_dict)}
+            self.failed_list.sort(key=lambda one: order[one["name"]])
+        else:
+            for videos in groups:
+                self.process_videos(videos)
 
         if len(self.failed_list):
             print("\n===============================", end="")
@@ -399,12 +843,60 @@ class GetSubtitles(object):
             )
         )
 
-        return {
+        result = {
             "total": len(all_video_dict),
             "success": len(all_video_dict) - len(self.failed_list),
             "fail": len(self.failed_list),
             "fail_videos": self.failed_list,
         }
+        result["info_cache"] = info_cache.stats()
+        if self.debug:
+            print(
+                "guessit cache: hits %(hits)s  misses %(misses)s  "
+                "hit rate %(hit_rate).2f\n" % result["info_cache"]
+            )
+        if self.archive_store is not None:
+            result["archive_store"] = self.archive_store.stats()
+        if self.negative_cache is not None:
+            result["negative_cache"] = self.negative_cache.stats()
+            if any(result["negative_cache"].values()):
+                print(
+                    "no-subtitle backoff: skipped %(skipped)s  "
+                    "backing off %(backing_off)s\n" % result["negative_cache"]
+                )
+        result["rate_limit"] = ratelimit.stats()
+        for site, bucket in result["rate_limit"].items():
+            if bucket["throttles"]:
+                print(
+                    "%s throttled %s times, rate %s req/s, waited %ss\n"
+                    % (site, bucket["throttles"], bucket["rate"], bucket["waited"],)
+                )
+        result["library_state"] = self.library_state.stats()
+        if result["library_state"]["skipped"]:
+            print(
+                "library state: skipped %(skipped)s unchanged videos\n"
+                % result["library_state"]
+            )
+        if self.search_cache is not None:
+            result["search_cache"] = self.search_cache.stats()
+            print(
+                "search cache: hits %(hits)s  misses %(misses)s  entries %(entries)s\n"
+                % result["search_cache"]
+            )
+        result["metrics"] = metrics.report()
+        if self.debug:
+            for stage, sites in result["metrics"]["timers"].items():
+                for site, histogram in sites.items():
+                    print(
+                        "%-8s %-7s count %-5s total %.2fs"
+                        % (stage, site, histogram["count"], histogram["sum"])
+                    )
+            print()
+        if self.metrics_json:
+            metrics.write_json(self.metrics_json, result["metrics"])
+        if self.metrics_prom:
+            metrics.write_prometheus(self.metrics_prom, result["metrics"])
+        return result
 
 
 def main():
@@ -414,7 +906,10 @@ def main():
         formatter_class=argparse.RawTextHelpFormatter,
     )
     arg_parser.add_argument(
-        "-v", "--version", action="version", version="%(prog)s " + __version__
+        "-v",
+        "--version",
+        action=VersionAction,
+        help="show program's version number and exit",
     )
     arg_parser.add_argument(
         "name", help="the video's name or full path or a dir with videos"
@@ -454,7 +949,11 @@ def main():
         "if two types exist in the same archive",
     )
     arg_parser.add_argument(
-        "-d", "--downloader", action="store", help="choose downloader"
+        "-d",
+        "--downloader",
+        action="store",
+        choices=registry.names(),
+        help="choose downloader",
     )
     arg_parser.add_argument(
         "--debug", action="store_true", help="show more info of the error"
@@ -464,25 +963,158 @@ def main():
         action="store_true",
         help="add .zh to the subtitle's name for plex to recognize",
     )
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        action="store",
+        type=int,
+        default=1,
+        help="process N videos in parallel when given a directory",
+    )
+    arg_parser.add_argument(
+        "--backend",
+        action="store",
+        choices=["requests", "asyncio"],
+        default="requests",
+        help="http backend, asyncio runs all requests on one event loop\n"
+        "(requires aiohttp)",
+    )
+    arg_parser.add_argument(
+        "--cache-ttl",
+        action="store",
+        type=int,
+        default=3600,
+        help="seconds to reuse cached search results, 0 to disable the cache",
+    )
+    arg_parser.add_argument(
+        "--cache-size",
+        action="store",
+        type=int,
+        default=10000,
+        help="max number of cached search results",
+    )
+    arg_parser.add_argument(
+        "--archive-store-size",
+        action="store",
+        type=int,
+        default=200,
+        help="MB of downloaded archives kept for re-extraction, 0 to disable",
+    )
+    arg_parser.add_argument(
+        "--parallel-ladder",
+        action="store_true",
+        help="search all keyword variants of a video at the same time\n"
+        "instead of one after another",
+    )
+    arg_parser.add_argument(
+        "--rescan",
+        action="store_true",
+        help="re-evaluate every video instead of skipping the unchanged ones\n"
+        "that already got subtitles in previous runs",
+    )
+    arg_parser.add_argument(
+        "--retry-backoff",
+        action="store",
+        type=int,
+        default=3600,
+        help="seconds to wait before searching again for a video without\n"
+        "subtitles, doubled after each failure, 0 to always search",
+    )
+    arg_parser.add_argument(
+        "--retry-backoff-max",
+        action="store",
+        type=int,
+        default=7 * 24 * 3600,
+        help="max seconds to wait before searching again",
+    )
+    arg_parser.add_argument(
+        "--metrics-json",
+        action="store",
+        help="write per-stage timings and counters to a JSON file",
+    )
+    arg_parser.add_argument(
+        "--metrics-prom",
+        action="store",
+        help="write per-stage timings and counters to a Prometheus textfile\n"
+        "(e.g. for node_exporter's textfile collector)",
+    )
+    arg_parser.add_argument(
+        "--parse-workers",
+        action="store",
+        type=int,
+        default=0,
+        help="processes used to parse video names ahead of searching,\n"
+        "0 for one per CPU core, 1 to parse each video when it is processed",
+    )
+    arg_parser.add_argument(
+        "--season-pack",
+        action="store_true",
+        help="download one season pack for all episodes of a season in the\n"
+        "directory and extract every episode's subtitle from it in one pass",
+    )
+    arg_parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep watching the directory and download subtitles for new videos\n"
+        "(uses inotify if inotify_simple is installed, polling otherwise)",
+    )
+    arg_parser.add_argument(
+        "--settle",
+        action="store",
+        type=float,
+        default=10,
+        help="seconds a new video must stay unchanged before it is processed\n"
+        "in watch mode",
+    )
+    arg_parser.add_argument(
+        "--poll-interval",
+        action="store",
+        type=float,
+        default=5,
+        help="seconds between directory scans when inotify is unavailable",
+    )
 
     args = arg_parser.parse_args()
 
     if args.over:
         print("\nThe script will replace the old subtitles if exist...\n")
 
-    GetSubtitles(
-        args.name,
-        args.query,
-        args.single,
-        args.save_original,
-        args.both,
-        args.over,
-        args.plex,
-        args.debug,
-        sub_num=args.number,
-        downloader=args.downloader,
-        sub_path=args.directory,
-    ).start()
+    if args.watch and not os.path.isdir(args.name.replace('"', "")):
+        arg_parser.error("--watch requires a directory")
+
+    try:
+        get_subtitles = GetSubtitles(
+            args.name,
+            args.query,
+            args.single,
+            args.save_original,
+            args.both,
+            args.over,
+            args.plex,
+            args.debug,
+            sub_num=args.number,
+            downloader=args.downloader,
+            sub_path=args.directory,
+            jobs=args.jobs,
+            backend=args.backend,
+            cache_ttl=args.cache_ttl,
+            cache_size=args.cache_size,
+            archive_store_size=args.archive_store_size,
+            parallel_ladder=args.parallel_ladder,
+            rescan=args.rescan,
+            retry_backoff=args.retry_backoff,
+            retry_backoff_max=args.retry_backoff_max,
+            metrics_json=args.metrics_json,
+            metrics_prom=args.metrics_prom,
+            parse_workers=args.parse_workers,
+            season_pack=args.season_pack,
+        )
+    except RuntimeError as e:  # 缺少所选后端的依赖
+        arg_parser.error(str(e))
+    if args.watch:
+        get_subtitles.watch(args.settle, args.poll_interval)
+    else:
+        get_subtitles.start()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+# coding: utf-8
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+""" 运行指标
+    按阶段（guessit、search、resolve、download、extract）与站点记录耗时直方图，
+    并按站点统计请求数、下载字节数、重试次数与缓存命中数。
+    运行结束后可输出为 JSON 报告或 Prometheus textfile collector 格式的文本文件。
+"""
+
+# 直方图桶上限（秒）
+default_buckets = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram(object):
+    def __init__(self, buckets=default_buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个为 +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self):
+
+        """ 返回 {'count', 'sum', 'buckets': {上限: 累计次数}} """
+
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {"count": self.count, "sum": round(self.sum, 6), "buckets": buckets}
+
+
+class Metrics(object):
+    def __init__(self):
+        self.timers = {}  # {(阶段, 站点): Histogram}
+        self.counters = {}  # {(名称, 站点): 数值}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds, site=""):
+        with self._lock:
+            histogram = self.timers.get((stage, site))
+            if histogram is None:
+                histogram = self.timers[(stage, site)] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage, site=""):
+
+        """ 记录 with 语句块的耗时，抛出异常时同样记录 """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, site)
+
+    def inc(self, name, site="", value=1):
+        with self._lock:
+            self.counters[(name, site)] = self.counters.get((name, site), 0) + value
+
+    def report(self):
+
+        """ 返回 {'timers': {阶段: {站点: 直方图}}, 'counters': {名称: {站点: 数值}}}
+            不区分站点的指标站点名为空字符串 """
+
+        with self._lock:
+            timers, counters = {}, {}
+            for (stage, site), histogram in sorted(self.timers.items()):
+                timers.setdefault(stage, {})[site] = histogram.to_dict()
+            for (name, site), value in sorted(self.counters.items()):
+                counters.setdefault(name, {})[site] = value
+        return {"timers": timers, "counters": counters}
+
+    def to_prometheus(self, report=None):
+
+        """ 返回 Prometheus 文本格式的指标 """
+
+        report = report or self.report()
+        lines = [
+            "# HELP getsubtitle_stage_seconds Time spent in each stage.",
+            "# TYPE getsubtitle_stage_seconds histogram",
+        ]
+        for stage, sites in report["timers"].items():
+            for site, histogram in sites.items():
+                labels = 'stage="%s",site="%s"' % (stage, site)
+                for bound, count in histogram["buckets"].items():
+                    lines.append(
+                        'getsubtitle_stage_seconds_bucket{%s,le="%s"} %s'
+                        % (labels, bound, count)
+                    )
+                lines.append(
+                    "getsubtitle_stage_seconds_sum{%s} %s" % (labels, histogram["sum"])
+                )
+                lines.append(
+                    "getsubtitle_stage_seconds_count{%s} %s"
+                    % (labels, histogram["count"])
+                )
+        for name, sites in report["counters"].items():
+            metric = "getsubtitle_%s_total" % name
+            lines.append("# TYPE %s counter" % metric)
+            for site, value in sites.items():
+                lines.append('%s{site="%s"} %s' % (metric, site, value))
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path, report=None):
+        write_atomic(path, json.dumps(report or self.report(), indent=2))
+
+    def write_prometheus(self, path, report=None):
+        write_atomic(path, self.to_prometheus(report))
+
+    def clear(self):
+        with self._lock:
+            self.timers.clear()
+            self.counters.clear()
+
+
+def write_atomic(path, text):
+
+    """ 先写入临时文件再替换，避免 textfile collector 读到写了一半的文件 """
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+metrics = Metrics()  # 全局运行指标
@@ -1,33 +1,70 @@
-from typing import Callable, Optional
+from collections import namedtuple
+from typing import Optional
 
-from pydantic import BaseModel
 
+""" 候选字幕模型
+    下载器的搜索结果为 Subtitle 对象，只保存标题、版本、语言值、字幕页面链接与所属下载器，
+    字幕详情页的解析与压缩包下载都推迟到调用 resolve()、download() 时进行，
+    未被选中的候选字幕不产生额外的请求。
+"""
 
-class SubtitleLanguage(BaseModel):
-    zh_hans: bool = False
-    zh_hant: bool = False
-    eng: bool = False
+SubtitleLanguage = namedtuple("SubtitleLanguage", ["zh_hans", "zh_hant", "eng"])
+
+SubtitleFile = namedtuple("SubtitleFile", ["datatype", "content"])
 
 
 def get_subtitle_languages(name: str) -> SubtitleLanguage:
-    language = SubtitleLanguage()
-    if "英文" in name or "eng" in name:
-        language.eng = True
-    if "简体" in name or "chs" in name:
-        language.zh_hans = True
-    if "繁体" in name or "cht" in name:
-        language.zh_hant = True
-    return language
-
-
-class SubtitleFile(BaseModel):
-    datatype: str
-    content: bytes
-
-
-class Subtitle(BaseModel):
-    title: str
-    version: str
-    language: SubtitleLanguage
-    link: str
-    download: Callable[[], Optional[SubtitleFile]]
+    return SubtitleLanguage(
+        zh_hans="简体" in name or "chs" in name,
+        zh_hant="繁体" in name or "cht" in name,
+        eng="英文" in name or "eng" in name,
+    )
+
+
+class Subtitle(object):
+
+    """ 候选字幕
+            title: 带 [站点] 前缀的字幕名
+            version: 用于匹配视频的版本信息，站点未提供时与 title 相同
+            lan: 字幕包含语言值（英文加1， 繁体加2， 简体加4， 双语加8），
+                 尚未解析时为 None
+            link: 字幕页面链接，同一字幕的链接不变
+            source: 所属下载器，负责解析与下载
+            data: 下载器需要的其他信息 """
+
+    __slots__ = ("title", "version", "lan", "link", "source", "data")
+
+    def __init__(self, title, version, lan, link, source=None, data=None):
+        self.title = title
+        self.version = version
+        self.lan = lan
+        self.link = link
+        self.source = source
+        self.data = data
+
+    def __repr__(self):
+        return "Subtitle(%r, lan=%r)" % (self.title, self.lan)
+
+    @property
+    def resolved(self) -> bool:
+        return self.lan is not None
+
+    @property
+    def language(self) -> SubtitleLanguage:
+        lan = self.lan or 0
+        return SubtitleLanguage(
+            zh_hans=bool(lan & 4), zh_hant=bool(lan & 2), eng=bool(lan & 1)
+        )
+
+    def resolve(self):
+
+        """ 补全语言值，需要解析详情页的站点在此时发送请求 """
+
+        if not self.resolved:
+            self.source.resolve_subtitles([self])
+
+    def download(self) -> Optional[SubtitleFile]:
+
+        """ 下载字幕包，下载失败时返回 None """
+
+        return self.source.download_subtitle(self)
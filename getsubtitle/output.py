@@ -0,0 +1,85 @@
+# coding: utf-8
+
+import io
+import threading
+from contextlib import contextmanager
+
+from .progress_bar import board
+
+
+""" 多线程输出缓冲
+    并发处理视频时，每个工作线程的输出先写入线程自己的缓冲区，
+    单个视频处理完毕后再整块写出，避免不同视频的输出互相穿插。
+"""
+
+
+def collapse_carriage_returns(text):
+
+    """ 进度条使用 '\\r' 原地刷新，缓冲后只保留每行最后一次刷新的内容 """
+
+    lines = []
+    for line in text.split("\n"):
+        segments = [one for one in line.split("\r") if one]
+        lines.append(segments[-1] if segments else "")
+    return "\n".join(lines)
+
+
+class ThreadBufferedStream(object):
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        buff = getattr(self._local, "buff", None)
+        if buff is not None:
+            return buff.write(text)
+        with self._lock:
+            return self.stream.write(text)
+
+    def write_raw(self, text):
+
+        """ 绕过线程缓冲直接写出，供进度状态行使用 """
+
+        with self._lock:
+            self.stream.write(text)
+            self.stream.flush()
+
+    def flush(self):
+        if getattr(self._local, "buff", None) is None:
+            with self._lock:
+                self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def wrap(self, fn):
+
+        """ 返回在当前线程的缓冲区中运行 fn 的函数，
+            处理视频时再派生的线程（如并发搜索各站点）的输出同样计入该视频 """
+
+        buff = getattr(self._local, "buff", None)
+
+        def run(*args, **kwargs):
+            self._local.buff = buff
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._local.buff = None
+
+        return run
+
+    @contextmanager
+    def buffered(self):
+
+        """ 在此上下文中当前线程的输出被缓冲，退出时一次性写出 """
+
+        self._local.buff = io.StringIO()
+        try:
+            yield
+        finally:
+            text = collapse_carriage_returns(self._local.buff.getvalue())
+            self._local.buff = None
+            with board.cleared(), self._lock:
+                self.stream.write(text)
+                self.stream.flush()
@@ -0,0 +1,31 @@
+# coding: utf-8
+
+import re
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml  # noqa: F401
+
+    parser = "lxml"
+except ImportError:  # pragma: no cover
+    parser = "html.parser"
+
+
+""" 页面解析
+    安装了 lxml 时用 lxml 解析页面，否则使用 html.parser。
+    传入 SoupStrainer 时只为匹配的节点构建子树，页面其余部分只做词法分析，
+    匹配的节点成为文档的顶层节点，find/find_all 的用法不变。
+"""
+
+
+def make_soup(text, parse_only=None):
+    return BeautifulSoup(text, parser, parse_only=parse_only)
+
+
+def class_pattern(*names):
+
+    """ 返回匹配包含任一 class 的正则表达式，供 SoupStrainer 的 class_ 参数使用。
+        解析时 class 属性可能尚未拆分为列表，直接传入 class 名无法匹配多个 class 的节点 """
+
+    return re.compile(r"(^|\s)(%s)(\s|$)" % "|".join(map(re.escape, names)))
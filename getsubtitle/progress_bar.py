@@ -2,11 +2,121 @@
 
 from __future__ import print_function
 from __future__ import division
+
+import sys
+import threading
+import time
+from contextlib import contextmanager
 from time import sleep
 
 from shutil import get_terminal_size
 
 
+""" 进度显示
+    所有进行中的进度条由 board 在同一行内汇总显示，刷新频率不超过每秒 1 / interval 次，
+    终端宽度缓存 width_ttl 秒。标准输出不是终端（如 cron 或输出被重定向）时不显示任何进度。
+"""
+
+width_ttl = 1.0  # 终端宽度的缓存时间（秒）
+_width = {"columns": 80, "checked": None}
+
+
+def terminal_width():
+    now = time.monotonic()
+    if _width["checked"] is None or now - _width["checked"] > width_ttl:
+        _width["columns"] = get_terminal_size().columns
+        _width["checked"] = now
+    return _width["columns"]
+
+
+def fit(text, width):
+
+    """ 超出宽度时截断并以 '...' 结尾 """
+
+    if len(text) <= width:
+        return text
+    return text[: max(width - 3, 0)] + "..."
+
+
+def is_tty():
+    try:
+        return sys.stdout.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+def write_status(text):
+
+    """ 写出状态行，并发处理视频时绕过线程的输出缓冲直接写到终端 """
+
+    write_raw = getattr(sys.stdout, "write_raw", None)
+    if write_raw is not None:
+        return write_raw(text)
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+class ProgressBoard(object):
+
+    interval = 0.2  # 两次刷新的最小间隔（秒）
+
+    def __init__(self):
+        self.bars = []  # 进行中的进度条，按开始顺序排列
+        self.shown = 0  # 当前状态行的长度
+        self.painted = 0.0
+        self._lock = threading.RLock()
+
+    def add(self, bar):
+        with self._lock:
+            if bar not in self.bars:
+                self.bars.append(bar)
+
+    def remove(self, bar):
+        with self._lock:
+            if bar in self.bars:
+                self.bars.remove(bar)
+            self.clear()
+
+    def render(self, width):
+        if len(self.bars) == 1:
+            return self.bars[0].status(width)
+        line = "%s Get %d files: " % (self.bars[0].prefix_info, len(self.bars))
+        line += " | ".join(bar.short_status() for bar in self.bars)
+        return fit(line, width)
+
+    def update(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if not self.bars or (not force and now - self.painted < self.interval):
+                return
+            self.painted = now
+            line = self.render(terminal_width() - 1)
+            write_status("\r" + line.ljust(self.shown))
+            self.shown = len(line)
+
+    def clear(self):
+
+        """ 清除状态行，之后的输出从行首开始 """
+
+        with self._lock:
+            if self.shown:
+                write_status("\r" + " " * self.shown + "\r")
+                self.shown = 0
+                self.painted = 0.0
+
+    @contextmanager
+    def cleared(self):
+
+        """ 清除状态行并在 with 语句块内暂停刷新，用于整块写出其他输出 """
+
+        with self._lock:
+            self.clear()
+            yield
+
+
+board = ProgressBoard()
+
+
 class ProgressBar(object):
     def __init__(self, prefix_info, title="", total="", count_time=0):
         self.title = title
@@ -14,45 +124,67 @@ class ProgressBar(object):
         self.count_time = count_time
         self.prefix_info = prefix_info
         self.point = [0, 3]
+        self.current = 0
+        self.enabled = is_tty()
+        self.closed = False
+
+    def percent(self):
+        return self.current / self.total * 100
+
+    def status(self, width):
+        if self.total:
+            info = "%s '%%s'...  %.2f%%%%" % (self.prefix_info, self.percent())
+        else:
+            info = "%s %%s %s" % (self.prefix_info, "." * self.point[0])
+        # 标题过长时截断标题
+        title = fit(self.title, max(width - len(info) + 2, 4))
+        return fit(info % title, width)
+
+    def short_status(self):
+        title = fit(self.title, 20)
+        if self.total:
+            return "%s %.0f%%" % (title, self.percent())
+        return "%s %s" % (title, "." * self.point[0])
 
     def refresh(self, cur_len):
-        terminal_width = get_terminal_size().columns  # 获取终端宽度
-        info = "%s '%s'...  %.2f%%" % (
-            self.prefix_info,
-            self.title,
-            cur_len / self.total * 100,
-        )
-        while len(info) > terminal_width - 20:
-            self.title = self.title[0:-4] + "..."
-            info = "%s '%s'...  %.2f%%" % (
-                self.prefix_info,
-                self.title,
-                cur_len / self.total * 100,
-            )
-        end_str = "\r" if cur_len < self.total else "\n"
-        print(info, end=end_str)
+        self.current = cur_len
+        if cur_len >= self.total:
+            self.close(done=True)
+        elif self.enabled:
+            board.add(self)
+            board.update()
 
     def count_down(self):
-        terminal_width = get_terminal_size().columns
-
         for i in range(self.count_time + 1):
-            info = "%s %ss" % (self.prefix_info, self.count_time - i)
-            print(" " * (terminal_width - 5), end="\r")
-            print(info, end="\r")
+            if self.enabled:
+                info = "%s %ss" % (self.prefix_info, self.count_time - i)
+                write_status("\r" + info.ljust(terminal_width() - 5) + "\r")
             sleep(1)
 
     def point_wait(self, end=False):
-        terminal_width = get_terminal_size().columns
-
-        info = "%s %s " % (self.prefix_info, self.title)
-        info += "." * self.point[0]
-        end_str = "\r" if not end else "\n"
-        print(" " * (terminal_width - 5), end="\r")
-        print(info, end=end_str)
         if self.point[0] > self.point[1]:
             self.point[0] = 1
         else:
             self.point[0] += 1
+        if end:
+            self.close(done=True)
+        elif self.enabled:
+            board.add(self)
+            board.update()
+
+    def close(self, done=False):
+
+        """ 结束进度显示，done 为 True 时输出最终状态行 """
+
+        if self.closed:
+            return
+        self.closed = True
+        if not self.enabled:
+            return
+        board.remove(self)
+        if done:
+            print(self.status(terminal_width() - 1))
+        board.update(force=True)
 
 
 def main():
@@ -0,0 +1,143 @@
+# coding: utf-8
+
+import heapq
+import re
+
+
+""" 候选字幕排序
+    候选字幕与压缩包内的字幕文件使用同一套特征打分：语言、字幕格式，
+    以及与视频一致的压制组、分辨率与来源。所有特征词编译为一个正则表达式，
+    每个字符串只扫描一次，得分按字符串缓存。
+    选取时用堆只取出需要的前 k 个，不对全部候选排序。
+"""
+
+# 字幕语言得分：出现的每个特征词加一次分，与原有的子串查找得分相同
+language_tokens = {
+    "英文": 1,
+    "eng": 1,
+    "简体": 2,
+    "chs": 2,
+    "cht": 4,
+    "繁体": 4,
+    "中英": 8,
+}
+
+# ass 与 ssa 同时出现时只加一次分
+format_tokens = {"ass": 2, "ssa": 2, "srt": 1}
+
+# 与视频一致时加分的视频信息，值越大越重要
+video_features = {"release_group": 4, "screen_size": 2, "source": 1}
+
+
+# 被误按 cp437 解码的 gbk 文件名必然含有这些字符
+cp437_pattern = re.compile("[\x80-\u25ff]")
+
+
+def compile_tokens(tokens, ignore_case=()):
+
+    """ 在每个位置查找特征词，相互重叠的特征词（如“中英文”中的“中英”与“英文”）都能找到，
+        同一位置较长的特征词优先；ignore_case 中的特征词不区分大小写 """
+
+    alternatives = [
+        "(?i:%s)" % re.escape(token) if token in ignore_case else re.escape(token)
+        for token in sorted(tokens, key=len, reverse=True)
+    ]
+    return re.compile("(?=(%s))" % "|".join(alternatives))
+
+
+language_pattern = compile_tokens(language_tokens)
+
+
+def language_value(text):
+
+    """ 返回文本的字幕语言得分 """
+
+    return sum(language_tokens[token] for token in set(language_pattern.findall(text)))
+
+
+class Ranker(object):
+
+    """ 按视频信息构造的排序器，同一视频的候选字幕与字幕文件共用 """
+
+    def __init__(self, info_dict=None):
+        self.tokens = {}  # {特征词: (类别, 分值)}
+        for token, value in language_tokens.items():
+            self.tokens[token] = ("language", value)
+        for token, value in format_tokens.items():
+            self.tokens[token] = ("format", value)
+        video_tokens = set()
+        for key, value in video_features.items():
+            token = str((info_dict or {}).get(key) or "").lower()
+            if token and token not in self.tokens:
+                self.tokens[token] = ("video", value)
+                video_tokens.add(token)
+        self.pattern = compile_tokens(self.tokens, video_tokens)
+        self._features = {}
+
+    def features(self, text):
+
+        """ 扫描一次文本，返回 (语言值, 格式分, 视频特征分) """
+
+        features = self._features.get(text)
+        if features is None:
+            lan = matched = 0
+            formats = set()
+            for token in set(self.pattern.findall(text)):
+                kind, value = self.tokens.get(token) or self.tokens[token.lower()]
+                if kind == "language":
+                    lan += value
+                elif kind == "format":
+                    formats.add(value)
+                else:
+                    matched |= value
+            features = self._features[text] = (lan, sum(formats), matched)
+        return features
+
+    def subtitle_key(self, subtitle):
+
+        """ 候选字幕的排序键：语言得分优先，其次与视频一致的特征，
+            已解析出语言值的字幕使用站点给出的语言值 """
+
+        text = subtitle.title
+        if subtitle.version not in text:
+            text += " " + subtitle.version
+        lan, _, matched = self.features(text)
+        if subtitle.lan is not None:
+            lan = subtitle.lan
+        return lan, matched
+
+    def member_score(self, name):
+
+        """ 压缩包内字幕文件的得分：语言得分加格式分 """
+
+        filename = name.rsplit("/", 1)[-1]
+        if cp437_pattern.search(filename):
+            try:
+                # zipfile: Historical ZIP filename encoding
+                filename = filename.encode("cp437").decode("gbk")
+            except (UnicodeEncodeError, UnicodeDecodeError):
+                pass
+        lan, fmt, _ = self.features(filename)
+        return lan + fmt
+
+    @staticmethod
+    def top(items, k, key):
+
+        """ 返回得分最高的 k 项，得分相同时保持原有顺序 """
+
+        return heapq.nlargest(k, items, key=key)
+
+    def rank_subtitles(self, subtitles, k=None):
+        k = len(subtitles) if k is None else k
+        return self.top(subtitles, k, self.subtitle_key)
+
+    def iter_members(self, names):
+
+        """ 按得分从高到低逐个返回 (得分, 字幕文件名)，
+            调用方找到合适的文件后即可停止，其余文件不再排序 """
+
+        heap = [(-self.member_score(name), i, name) for i, name in enumerate(names)]
+        heapq.heapify(heap)
+        while heap:
+            score, _, name = heapq.heappop(heap)
+            yield -score, name
@@ -0,0 +1,93 @@
+# coding: utf-8
+
+import threading
+import time
+
+
+""" 站点请求限速
+    每个站点一个令牌桶，同一站点的所有搜索与下载请求（包括不同线程与异步后端的请求）
+    先从令牌桶取得令牌再发送。站点返回限流响应时速率减半并暂停 cooldown 秒，
+    之后每次成功的请求逐步恢复速率。各站点的令牌桶相互独立，一个站点冷却时其他站点照常请求。
+"""
+
+throttle_status = (429, 503)  # 视为限流的响应状态码
+
+
+class TokenBucket(object):
+    def __init__(self, rate=4.0, burst=8, min_rate=0.1, cooldown=10):
+        self.max_rate = self.rate = float(rate)  # 每秒令牌数
+        self.burst = burst  # 令牌桶容量
+        self.min_rate = min_rate
+        self.cooldown = cooldown
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0  # 冷却结束时间
+        self.throttles = 0
+        self.waited = 0.0  # 累计等待秒数
+        self._lock = threading.Lock()
+
+    def reserve(self):
+
+        """ 预订一个令牌，返回发送请求前需要等待的秒数 """
+
+        with self._lock:
+            now = time.monotonic()
+            # 冷却期间不补充令牌
+            elapsed = max(now - max(self.updated, self.paused_until), 0.0)
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            delay = max(self.paused_until - now, 0.0) + max(
+                -self.tokens / self.rate, 0.0
+            )
+            self.waited += delay
+            return delay
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def throttled(self):
+
+        """ 站点返回限流响应，速率减半并暂停一段时间 """
+
+        with self._lock:
+            self.throttles += 1
+            self.rate = max(self.rate / 2, self.min_rate)
+            self.tokens = min(self.tokens, 0.0)
+            self.paused_until = time.monotonic() + self.cooldown
+
+    def succeeded(self):
+
+        """ 请求成功，逐步恢复速率 """
+
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.rate + self.min_rate, self.max_rate)
+
+    def stats(self):
+        return {
+            "rate": round(self.rate, 2),
+            "throttles": self.throttles,
+            "waited": round(self.waited, 2),
+        }
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(site, rate=4.0, burst=8):
+
+    """ 返回站点共用的令牌桶，首次调用时按 rate 与 burst 创建 """
+
+    with _buckets_lock:
+        if site not in _buckets:
+            _buckets[site] = TokenBucket(rate, burst)
+        return _buckets[site]
+
+
+def stats():
+    with _buckets_lock:
+        return {site: bucket.stats() for site, bucket in _buckets.items()}
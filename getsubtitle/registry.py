@@ -0,0 +1,30 @@
+# coding: utf-8
+
+from collections import OrderedDict as order_dict
+from importlib import import_module
+
+
+""" 下载器注册表
+    按名称登记各站点下载器所在的模块与类名，只在需要某个下载器时才导入对应模块，
+    避免每次启动都导入 requests、bs4 等站点依赖。顺序即默认的搜索优先级。
+"""
+
+downloaders = order_dict(
+    [
+        ("subhd", ("getsubtitle.subhd", "SubHDDownloader")),
+        ("zimuzu", ("getsubtitle.zimuzu", "ZimuzuDownloader")),
+        ("zimuku", ("getsubtitle.zimuku", "ZimukuDownloader")),
+    ]
+)
+
+
+def load_class(name):
+
+    """ 导入并返回注册的下载器类 """
+
+    module_name, class_name = downloaders[name]
+    return getattr(import_module(module_name), class_name)
+
+
+def names():
+    return list(downloaders.keys())
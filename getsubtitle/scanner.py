@@ -0,0 +1,99 @@
+# coding: utf-8
+
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .constants import sub_format_list, video_format_list
+
+
+""" 视频库扫描
+    用 os.scandir 并行列出各级目录，按 os.walk 的先序顺序返回结果，
+    并把已有的字幕文件名整理成集合，检查视频是否已有字幕时只需一次查找。
+"""
+
+video_formats = frozenset(video_format_list)
+sub_formats = frozenset(sub_format_list)
+
+
+def list_dir(path, executor):
+
+    """ 列出目录，返回 (文件名列表, 子目录列表的 Future)
+        子目录在线程池中继续列出，不跟随指向目录的符号链接，无法读取的目录视为空目录 """
+
+    files, children = [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    files.append(entry.name)
+                elif not entry.is_symlink():
+                    children.append(
+                        (entry.path, executor.submit(list_dir, entry.path, executor))
+                    )
+    except OSError:
+        pass
+    return files, children
+
+
+def walk(top, workers=8):
+
+    """ 与 os.walk(top) 顺序相同，返回 (目录路径, 文件名列表) """
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        stack = [(top, executor.submit(list_dir, top, executor))]
+        while stack:
+            path, future = stack.pop()
+            files, children = future.result()
+            yield path, files
+            stack.extend(reversed(children))
+
+
+def sidecar_index(names):
+
+    """ 返回已有字幕的视频名集合（不含后缀），
+        video.ass 与 video.zh.ass 都记为 video """
+
+    index = set()
+    for name in names:
+        stem, suffix = os.path.splitext(name)
+        if suffix not in sub_formats:
+            continue
+        index.add(stem)
+        if stem.endswith(".zh"):
+            index.add(stem[:-3])
+    return index
+
+
+def scan_videos(top, store_path="", workers=8):
+
+    """ 扫描文件夹中的视频，返回 {视频文件名: {'path', 'have_subtitle', 'video_path'}}
+        store_path 非空时字幕保存在 store_path，其中的字幕同样视为已有字幕 """
+
+    store_index = set()
+    if store_path:
+        for _, files in walk(store_path, workers):
+            store_index |= sidecar_index(files)
+    video_dict = OrderedDict()
+    for root, files in walk(top, workers):
+        dir_index = None
+        for one_name in files:
+            v_name_no_format, suffix = os.path.splitext(one_name)
+            # 检查后缀是否为视频格式
+            if suffix not in video_formats:
+                continue
+            if dir_index is None:
+                dir_index = sidecar_index(files)
+            sub_exists = int(
+                v_name_no_format in dir_index or v_name_no_format in store_index
+            )
+            video_dict[one_name] = {
+                "path": store_path or os.path.abspath(root),
+                "have_subtitle": sub_exists,
+                "video_path": os.path.abspath(os.path.join(root, one_name)),
+            }
+    return video_dict
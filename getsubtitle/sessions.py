@@ -0,0 +1,81 @@
+# coding: utf-8
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metrics import metrics
+from .ratelimit import throttle_status
+
+
+""" 共用的 HTTP 会话
+    每个站点的下载器在整个运行期间复用一个带连接池的会话，
+    保持连接、限制单个主机的连接数，并对连接错误与服务器错误按退避间隔重试。
+    会话的每个请求先从站点的令牌桶取得令牌。
+"""
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    def __init__(self, bucket=None, site="", **kwargs):
+        self.bucket = bucket
+        self.site = site  # 指标中的站点名
+        super(RateLimitedAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self.bucket is not None:
+            self.bucket.acquire()
+        response = super(RateLimitedAdapter, self).send(request, **kwargs)
+        metrics.inc("requests", self.site)
+        retries = getattr(response.raw, "retries", None)
+        if retries is not None and retries.history:
+            metrics.inc("retries", self.site, len(retries.history))
+        if self.bucket is not None:
+            if response.status_code in throttle_status:
+                self.bucket.throttled()
+            else:
+                self.bucket.succeeded()
+        return response
+
+
+def create_session(
+    headers=None,
+    retries=3,
+    backoff_factor=0.5,
+    pool_connections=4,
+    pool_maxsize=8,
+    bucket=None,
+    site="",
+):
+
+    """ 创建会话
+            retries: 连接错误、读取错误及 500/502/504 响应的最大重试次数
+            backoff_factor: 重试间隔为 backoff_factor * 2 ** (重试次数 - 1) 秒
+            pool_connections: 缓存连接池的主机数
+            pool_maxsize: 单个主机的最大连接数，连接用尽时等待空闲连接
+            bucket: 站点的令牌桶 TokenBucket，为None时不限速
+            site: 请求数等指标记录在此站点名下 """
+
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        # 限流状态码 throttle_status 不重试，交给令牌桶降低请求速率
+        status_forcelist=(500, 502, 504),
+        raise_on_status=False,
+    )
+    adapter = RateLimitedAdapter(
+        bucket=bucket,
+        site=site,
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry,
+        pool_block=True,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
@@ -0,0 +1,124 @@
+# coding: utf-8
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .cache import get_cache_dir
+
+
+""" 视频库状态
+    以视频路径为键记录文件大小、修改时间、解析出的视频信息、选中的字幕、字幕来源站点及处理结果，
+    再次扫描同一目录时跳过大小与修改时间均未变化且已有字幕的视频。
+"""
+
+finished_outcomes = ("success", "exists")  # 再次运行时可以跳过的处理结果
+
+
+class LibraryState(object):
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_cache_dir(), "library.sqlite3")
+        self.skipped = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS videos ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime REAL, info TEXT, "
+                "subtitle TEXT, site TEXT, outcome TEXT, error TEXT, updated REAL)"
+            )
+
+    @staticmethod
+    def stat(video_path):
+
+        """ 返回视频文件的 (大小, 修改时间)，文件不存在时返回None """
+
+        try:
+            st = os.stat(video_path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime
+
+    def get(self, video_path):
+
+        """ 返回视频的上次处理记录，没有记录时返回None """
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime, info, subtitle, site, outcome, error, updated "
+                "FROM videos WHERE path = ?",
+                (video_path,),
+            ).fetchone()
+        if row is None:
+            return None
+        size, mtime, info, subtitle, site, outcome, error, updated = row
+        return {
+            "size": size,
+            "mtime": mtime,
+            "info": json.loads(info) if info else None,
+            "subtitle": subtitle,
+            "site": site,
+            "outcome": outcome,
+            "error": error,
+            "updated": updated,
+        }
+
+    def is_finished(self, video_path, stat, count=True):
+
+        """ 视频文件未变化且上次已下载到字幕或已有字幕时返回True，
+            count 为 True 时计入跳过的视频数 """
+
+        record = self.get(video_path)
+        if (
+            record is None
+            or stat is None
+            or (record["size"], record["mtime"]) != tuple(stat)
+            or record["outcome"] not in finished_outcomes
+        ):
+            return False
+        if count:
+            self.skipped += 1
+        return True
+
+    def record(
+        self, video_path, stat, outcome, info=None, subtitle=None, site=None, error=""
+    ):
+        if stat is None:
+            return
+        size, mtime = stat
+        info = json.dumps(dict(info), default=str) if info is not None else None
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        video_path,
+                        size,
+                        mtime,
+                        info,
+                        subtitle,
+                        site,
+                        outcome,
+                        error,
+                        time.time(),
+                    ),
+                )
+            self.recorded += 1
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+    def stats(self):
+        return {
+            "skipped": self.skipped,
+            "recorded": self.recorded,
+            "entries": len(self),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,133 @@
+# coding: utf-8
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from .cache import get_cache_dir
+
+
+""" 字幕压缩包本地存储
+    下载过的压缩包按 sha256 保存在本地，并记录下载链接到 sha256 的索引，
+    同一字幕包再次解压（如更换 --both/--plex 参数或用于同一季的其他视频）时直接读取本地文件。
+    总大小超过上限时淘汰最久未使用的压缩包。
+"""
+
+
+class ArchiveStore(object):
+    def __init__(self, path=None, max_size=200 * 1024 * 1024):
+        self.path = path or os.path.join(get_cache_dir(), "archives")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(self.path, "index.sqlite3"), check_same_thread=False
+        )
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "sha256 TEXT PRIMARY KEY, datatype TEXT, size INTEGER, accessed REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS links (link TEXT PRIMARY KEY, sha256 TEXT)"
+            )
+
+    def blob_path(self, sha256):
+        return os.path.join(self.path, sha256[:2], sha256)
+
+    def get(self, link):
+
+        """ 传入下载链接，返回 (压缩包类型, 压缩包字节数据)，本地没有时返回None """
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256 FROM links WHERE link = ?", (link,)
+            ).fetchone()
+        result = self.get_by_hash(row[0]) if row else None
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def get_by_hash(self, sha256):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT datatype FROM blobs WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+            if row is None:
+                return None
+            try:
+                with open(self.blob_path(sha256), "rb") as f:
+                    data = f.read()
+            except OSError:
+                # 文件已被删除，清理索引
+                self._remove(sha256)
+                return None
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE blobs SET accessed = ? WHERE sha256 = ?",
+                    (time.time(), sha256),
+                )
+        return row[0], data
+
+    def put(self, link, datatype, data):
+
+        """ 保存压缩包，返回其 sha256 """
+
+        sha256 = hashlib.sha256(data).hexdigest()
+        blob_path = self.blob_path(sha256)
+        with self._lock:
+            if not os.path.exists(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                tmp_path = blob_path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, blob_path)
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?)",
+                    (sha256, datatype, len(data), time.time()),
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO links VALUES (?, ?)", (link, sha256)
+                )
+            self._evict()
+        return sha256
+
+    def _remove(self, sha256):
+        with self._conn:
+            self._conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+            self._conn.execute("DELETE FROM links WHERE sha256 = ?", (sha256,))
+        try:
+            os.remove(self.blob_path(sha256))
+        except OSError:
+            pass
+
+    def _evict(self):
+        total = self._conn.execute("SELECT SUM(size) FROM blobs").fetchone()[0] or 0
+        if total <= self.max_size:
+            return
+        rows = self._conn.execute(
+            "SELECT sha256, size FROM blobs ORDER BY accessed ASC"
+        ).fetchall()
+        for sha256, size in rows:
+            if total <= self.max_size:
+                break
+            self._remove(sha256)
+            total -= size
+
+    def size(self):
+        with self._lock:
+            return self._conn.execute("SELECT SUM(size) FROM blobs").fetchone()[0] or 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": self.size()}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
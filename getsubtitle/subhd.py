@@ -2,143 +2,143 @@
 # !/usr/bin/env python3
 
 from __future__ import print_function
-import time
 import json
 import re
 from contextlib import closing
-from collections import OrderedDict as order_dict
 
 import requests
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
 
+from .downloader import Downloader, SearchRejected
+from .metrics import metrics
+from .models import SubtitleFile
+from .parsing import class_pattern, make_soup
 from .sys_global_var import prefix
-from .progress_bar import ProgressBar
 from .utils import get_type_score
 
 
 """ SubHD 字幕下载器
 """
 
+search_strainer = SoupStrainer("div", class_=class_pattern("box"))
+detail_strainer = SoupStrainer("button", id="down")
 
-class SubHDDownloader(object):
-    def __init__(self):
-        self.headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_9_5)\
-                            AppleWebKit 537.36 (KHTML, like Gecko) Chrome",
-            "Accept-Language": "zh-CN,zh;q=0.8",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,\
-                            image/webp,*/*;q=0.8",
-        }
+
+class SubHDDownloader(Downloader):
+
+    name = "SUBHD"
+    rate = 1.0
+    burst = 2
+
+    def __init__(self, cache=None, session=None):
+        super(SubHDDownloader, self).__init__(cache, session)
         self.site_url = "https://subhd.tv"
         self.search_url = "https://subhd.tv/search/"
 
-    def get_subtitles(self, keywords, sub_num=5):
-
-        """ 传入关键字列表，返回有序字典。
-                keywords:重要度降序的关键字列表
-                sub_num: 字幕结果数，默认为5
-            返回：
-                字幕字典:{
-                            '字幕名': {'lan': '字幕包含语言值',
-                                       'link': '字幕链接'}
-                         }
-                         按语言值降序排列
-                字幕包含语言值：英文加1， 繁体加2， 简体加4， 双语加8 """
-
-        print(prefix + " Searching SUBHD...", end="\r")
-
-        keywords = list(keywords)
-        keyword = ""
-        for one in keywords:
-            keyword += one + " "
-
-        sub_dict = order_dict()
-        s = requests.session()
-        while True:
-            # 当前关键字查询
-            r = s.get(self.search_url + keyword, headers=self.headers, timeout=10)
-            bs_obj = BeautifulSoup(r.text, "html.parser")
-            try:
-                small_text = bs_obj.find("small").text
-            except AttributeError as e:
-                char_error = "The URI you submitted has disallowed characters"
-                if char_error in bs_obj.text:
-                    print(prefix + " [SUBHD ERROR] " + char_error + ": " + keyword)
-                    return None
-                # 搜索验证按钮
-                time.sleep(2)
-                continue
-
-            if "总共 0 条" not in small_text:
-                for one_box in bs_obj.find_all("div", {"class": "box"}):
-                    a = one_box.find("div", {"class": "d_title"}).find("a")
-                    sub_url = self.site_url + a.attrs["href"]
-                    sub_name = "[SUBHD]" + a.text
-                    text = one_box.text
-                    if "/ar" in a.attrs["href"]:
-                        sub_dict[sub_name] = {
-                            "lan": get_type_score(text),
-                            "link": sub_url,
-                            "version": a.attrs["title"],
-                        }
-                    if len(sub_dict) >= sub_num:
-                        del keywords[:]  # 字幕条数达到上限，清空keywords
-                        break
-
-            if len(keywords) > 1:  # 字幕数未满，更换关键词继续查询
-                keyword = keyword.replace(keywords[-1], "")
-                keywords.pop(-1)
-                continue
-
-            break
-
-        if len(sub_dict.items()) > 0 and list(sub_dict.items())[0][1]["lan"] < 8:
-            # 第一个候选字幕没有双语
-            sub_dict = order_dict(
-                sorted(sub_dict.items(), key=lambda e: e[1]["lan"], reverse=False)
+    def parse_search(self, text, keywords, info_dict=None):
+
+        """ 解析搜索页面，返回 [(字幕名, 字幕信息)]
+                字幕信息: {'lan': '字幕包含语言值', 'link': '字幕链接',
+                           'version': '字幕版本'}
+            出现搜索验证页面时返回None，关键字含有站点不允许的字符时
+            抛出 SearchRejected """
+
+        small = re.search(r"<small[^>]*>(.*?)</small>", text, re.S)
+        if small is None:
+            char_error = "The URI you submitted has disallowed characters"
+            if char_error in text:
+                print(prefix + " [SUBHD ERROR] " + char_error)
+                raise SearchRejected(char_error)
+            # 搜索验证按钮
+            return None
+
+        results = []
+        if "总共 0 条" not in small.group(1):
+            bs_obj = make_soup(text, search_strainer)
+            for one_box in bs_obj.find_all("div", {"class": "box"}):
+                a = one_box.find("div", {"class": "d_title"}).find("a")
+                sub_url = self.site_url + a.attrs["href"]
+                sub_name = "[SUBHD]" + a.text
+                text = one_box.text
+                if "/ar" in a.attrs["href"]:
+                    results.append(
+                        (
+                            sub_name,
+                            {
+                                "lan": get_type_score(text),
+                                "link": sub_url,
+                                "version": a.attrs["title"],
+                            },
+                        )
+                    )
+        return results
+
+    @staticmethod
+    def parse_dtoken(text):
+
+        """ 解析字幕页面，返回下载请求需要的 dtoken """
+
+        bs_obj = make_soup(text, detail_strainer)
+        return bs_obj.find("button", {"id": "down"})["dtoken"]
+
+    @staticmethod
+    def parse_down_ajax(content):
+
+        """ 解析下载请求的返回数据，返回压缩包下载链接，下载过于频繁时返回None """
+
+        content = content.decode("unicode-escape")
+        if json.loads(content)["success"] is False:
+            return None
+        res = re.search('http:.*(?=")', content)
+        return res.group(0).replace("\\/", "/")
+
+    def download_subtitle(self, subtitle):
+        return self.check_download(*self.download_file(subtitle.title, subtitle.link))
+
+    def check_download(self, datatype, sub_data_bytes, msg):
+
+        """ 下载过于频繁时提示更换下载器，返回 SubtitleFile 或 None """
+
+        if msg == "false":
+            print(
+                prefix + " error: "
+                "download too frequently "
+                "with subhd downloader after %d retries, "
+                "please change to other downloaders" % self.max_retries
             )
-        return sub_dict
+            return None
+        return SubtitleFile(datatype, sub_data_bytes)
 
     def download_file(self, file_name, sub_url):
 
         """ 传入字幕页面链接， 字幕包标题， 返回压缩包类型，压缩包字节数据 """
 
         sid = sub_url.split("/")[-1]
-        r = requests.get(sub_url, headers=self.headers)
-        bs_obj = BeautifulSoup(r.text, "html.parser")
-        dtoken = bs_obj.find("button", {"id": "down"})["dtoken"]
-
-        r = requests.post(
-            self.site_url + "/ajax/down_ajax",
-            data={"sub_id": sid, "dtoken": dtoken},
-            headers=self.headers,
-        )
-
-        content = r.content.decode("unicode-escape")
-        if json.loads(content)["success"] is False:
+        r = self.session.get(sub_url, timeout=10)
+        dtoken = self.parse_dtoken(r.text)
+
+        for _ in range(self.max_retries + 1):
+            r = self.session.post(
+                self.site_url + "/ajax/down_ajax",
+                data={"sub_id": sid, "dtoken": dtoken},
+                timeout=10,
+            )
+            download_link = self.parse_down_ajax(r.content)
+            if download_link is not None:
+                break
+            # 下载过于频繁，降低请求速率后重试
+            self.bucket.throttled()
+            metrics.inc("retries", self.name)
+        else:
             return None, None, "false"
-        res = re.search('http:.*(?=")', r.content.decode("unicode-escape"))
-        download_link = res.group(0).replace("\\/", "/")
         try:
-            with closing(requests.get(download_link, stream=True)) as response:
-                chunk_size = 1024  # 单次请求最大值
-                # 内容体总大小
-                content_size = int(response.headers["content-length"])
-                bar = ProgressBar(prefix + " Get", file_name.strip(), content_size)
-                sub_data_bytes = b""
-                for data in response.iter_content(chunk_size=chunk_size):
-                    sub_data_bytes += data
-                    bar.refresh(len(sub_data_bytes))
+            with closing(
+                self.session.get(download_link, stream=True, timeout=10)
+            ) as response:
+                sub_data_bytes = self.read_response(response, file_name)
             # sub_data_bytes = requests.get(download_link, timeout=10).content
         except requests.Timeout:
             return None, None, "false"
-        if "rar" in download_link:
-            datatype = ".rar"
-        elif "zip" in download_link:
-            datatype = ".zip"
-        elif "7z" in download_link:
-            datatype = ".7z"
-        else:
-            datatype = "Unknown"
+        datatype = self.guess_datatype(download_link)
 
         return datatype, sub_data_bytes, "success"
@@ -1,34 +1,202 @@
 import os
 import os.path
 import re
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
 from typing import List, Tuple
 
-from guessit import guessit
-
 from .constants import service_short_names
+from .ranking import Ranker, language_value
 from .sys_global_var import prefix
 
 
 def get_type_score(text: str) -> int:
-    type_score = 0
-    type_score += ("英文" in text) * 1
-    type_score += ("eng" in text) * 1
-    type_score += ("简体" in text) * 2
-    type_score += ("chs" in text) * 2
-    type_score += ("cht" in text) * 4
-    type_score += ("繁体" in text) * 4
-    type_score += ("中英" in text) * 8
-    return type_score
+
+    """ 返回字幕语言得分：英文加1， 简体加2， 繁体加4， 中英加8 """
+
+    return language_value(text)
 
 
 c_pattern = re.compile("[\u4e00-\u9fff]")
 e_pattern = re.compile("[a-zA-Z]")
 
 
-def get_info_dict(name: str):
-    name = name.replace("[", "")
-    name = name.replace("]", "")
-    info_dict = guessit(name)
+class FrozenInfo(Mapping):
+
+    """ 只读的视频信息，缓存中的解析结果被多处共用，不允许修改 """
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data):
+        self._data = {
+            key: tuple(value) if isinstance(value, list) else value
+            for key, value in data.items()
+        }
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return "FrozenInfo(%r)" % self._data
+
+    def __getstate__(self):
+        return self._data
+
+    def __setstate__(self, state):
+        self._data = state
+
+
+class InfoCache(object):
+
+    """ 有上限的 guessit 解析结果 LRU 缓存，键为规范化后的名称 """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def reserve(self, count):
+
+        """ 扩大容量，保证再放入 count 个条目时不淘汰已有条目 """
+
+        with self._lock:
+            self.maxsize = max(self.maxsize, len(self._data) + count)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self),
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+
+info_cache = InfoCache()
+
+
+def normalize_name(name: str) -> str:
+    return name.replace("[", "").replace("]", "").strip()
+
+
+def guess(name: str) -> FrozenInfo:
+
+    """ 返回 guessit 的解析结果，相同名称只解析一次 """
+
+    name = normalize_name(name)
+    info = info_cache.get(name)
+    if info is None:
+        # guessit 导入较慢，第一次解析时才导入
+        from guessit import guessit
+
+        info = FrozenInfo(guessit(name))
+        info_cache.put(name, info)
+    return info
+
+
+def _guess_names(names: List[str]) -> List[FrozenInfo]:
+
+    """ 在子进程中解析一组规范化后的名称，解析出错的名称返回 None """
+
+    from guessit import guessit
+
+    infos = []
+    for name in names:
+        try:
+            infos.append(FrozenInfo(guessit(name)))
+        except Exception:
+            infos.append(None)
+    return infos
+
+
+def preparse(names: List[str], workers: int = 0, chunk_size: int = 32) -> int:
+
+    """ 用进程池批量解析名称并放入 info_cache，之后的 guess 直接命中缓存。
+        workers 为 0 时使用全部 CPU 核心；只有一个进程或名称少于一批时不做处理，
+        由 guess 在需要时解析。返回放入缓存的名称数 """
+
+    pending = []
+    seen = set()
+    for name in names:
+        key = normalize_name(name)
+        if key not in info_cache and key not in seen:
+            seen.add(key)
+            pending.append(key)
+    chunks = [pending[i : i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    if workers < 2:
+        return 0
+
+    kwargs = {}
+    if threading.active_count() > 1:
+        # 已有其他线程时 fork 出的子进程可能继承被占用的锁，改用 forkserver 或 spawn
+        if sys.version_info < (3, 7):
+            return 0
+        import multiprocessing
+
+        methods = multiprocessing.get_all_start_methods()
+        method = "forkserver" if "forkserver" in methods else "spawn"
+        kwargs["mp_context"] = multiprocessing.get_context(method)
+
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+
+    info_cache.reserve(len(pending))
+    parsed = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers, **kwargs) as executor:
+            for chunk, infos in zip(chunks, executor.map(_guess_names, chunks)):
+                for key, info in zip(chunk, infos):
+                    if info is not None:
+                        info_cache.put(key, info)
+                        parsed += 1
+    except (OSError, BrokenProcessPool):
+        # 无法创建子进程时退回逐个解析
+        pass
+    return parsed
+
+
+def get_info_dict(name: str) -> FrozenInfo:
+    info_dict = dict(guess(name))
 
     # 若视频名中英混合，去掉字少的语言
     title = info_dict.get("title", "")
@@ -40,16 +208,16 @@ def get_info_dict(name: str):
     else:
         title = c_pattern.sub("", title)
     info_dict["title"] = title.strip()
-    return info_dict
+    return FrozenInfo(info_dict)
 
 
 must_matches = ["title", "streaming_service", "season", "episode", "source"]
 
 
 def video_match(a: Tuple[str, dict], b: Tuple[str, dict]):
-    if not isinstance(a, dict):
+    if not isinstance(a, Mapping):
         a = get_info_dict(a)
-    if not isinstance(b, dict):
+    if not isinstance(b, Mapping):
         b = get_info_dict(b)
 
     for keyword in must_matches:
@@ -58,32 +226,44 @@ def video_match(a: Tuple[str, dict], b: Tuple[str, dict]):
     return True
 
 
-def get_best_subtitle(subtitle_names: List[str], video_info: dict):
+def season_match(a: Tuple[str, dict], b: Tuple[str, dict]):
+
+    """ 与 video_match 相同，但 a 没有集数或集数范围包含 b 的集数时也视为匹配，
+        用于匹配整季字幕包 """
+
+    if not isinstance(a, Mapping):
+        a = get_info_dict(a)
+    if not isinstance(b, Mapping):
+        b = get_info_dict(b)
+
+    for keyword in must_matches:
+        if keyword != "episode" and a.get(keyword) != b.get(keyword):
+            return False
+    episode = a.get("episode")
+    if isinstance(episode, tuple):
+        return b.get("episode") in episode
+    return episode is None or episode == b.get("episode")
+
+
+def get_best_subtitle(subtitle_names: List[str], video_info: dict, quiet=False):
     """ 传入字幕列表，视频信息，返回最佳字幕名称。
-        若没有符合字幕，查询模式下返回第一条字幕， 否则返回None """
+        若没有符合字幕，查询模式下返回第一条字幕， 否则返回None
+        quiet 为 True 时不打印不匹配的字幕文件 """
 
     if not subtitle_names:
-        print(prefix + " warn: " + "no subtitle in this archive")
+        if not quiet:
+            print(prefix + " warn: " + "no subtitle in this archive")
         return None
-    current_max_score = 0
-    current_max_subtitle = None
-    for subtitle_name in subtitle_names:
-        filename = os.path.split(subtitle_name)[-1]  # 提取文件名
-        try:
-            filename = filename.encode("cp437").decode("gbk")
-        except:
-            pass
+    # 按得分从高到低检查，只对需要的字幕文件解析名称
+    for score, subtitle_name in Ranker(video_info).iter_members(subtitle_names):
+        if score <= 0:
+            break
         if not video_match(subtitle_name, video_info):
-            print(f"{subtitle_name} dismatch, continue")
+            if not quiet:
+                print(f"{subtitle_name} dismatch, continue")
             continue
-        score = get_type_score(filename)
-        score += ("ass" in filename or "ssa" in filename) * 2
-        score += ("srt" in filename) * 1
-
-        if score > current_max_score:
-            current_max_score = score
-            current_max_subtitle = subtitle_name
-    return current_max_subtitle
+        return subtitle_name
+    return None
 
 
 def get_keywords(info_dict):
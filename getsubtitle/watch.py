@@ -0,0 +1,164 @@
+# coding: utf-8
+
+import os
+import time
+
+from .scanner import video_formats, walk
+
+try:
+    import inotify_simple
+except ImportError:  # pragma: no cover
+    inotify_simple = None
+
+
+""" 监视模式
+    监视视频文件夹，新视频写入完成后交给 GetSubtitles 处理。
+    Linux 上安装了 inotify_simple 时使用 inotify，否则定时扫描目录。
+    文件在 settle 秒内大小与修改时间都没有变化才视为写入完成。
+"""
+
+
+def is_video(path):
+    return os.path.splitext(path)[1] in video_formats
+
+
+def stat_key(path):
+
+    """ 返回文件的 (大小, 修改时间)，文件不存在时返回None """
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime
+
+
+class PollingWatcher(object):
+
+    """ 每 interval 秒扫描一次目录，返回新出现或发生变化的视频路径 """
+
+    def __init__(self, top, interval=5):
+        self.top = top
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def scan(self):
+        snapshot = {}
+        for root, files in walk(self.top):
+            for name in files:
+                if is_video(name):
+                    path = os.path.join(root, name)
+                    snapshot[path] = stat_key(path)
+        return snapshot
+
+    def changed(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        snapshot = self.scan()
+        paths = [
+            path for path, key in snapshot.items() if self.snapshot.get(path) != key
+        ]
+        self.snapshot = snapshot
+        return paths
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+
+    """ 通过 inotify 监视目录树，返回写入、移入的视频路径 """
+
+    def __init__(self, top):
+        flags = inotify_simple.flags
+        self.mask = flags.CREATE | flags.CLOSE_WRITE | flags.MOVED_TO
+        self.inotify = inotify_simple.INotify()
+        self.paths = {}  # {watch descriptor: 目录路径}
+        for root, _ in walk(top):
+            self.add_watch(root)
+
+    def add_watch(self, path):
+        try:
+            self.paths[self.inotify.add_watch(path, self.mask)] = path
+        except OSError:
+            pass
+
+    def changed(self, timeout):
+        flags = inotify_simple.flags
+        paths = []
+        for event in self.inotify.read(timeout=int(timeout * 1000)):
+            if event.mask & flags.Q_OVERFLOW:
+                # 事件队列溢出，返回目录树中的所有视频
+                for top in list(self.paths.values()):
+                    paths.extend(self.list_videos(top))
+                continue
+            if event.wd not in self.paths:
+                continue
+            path = os.path.join(self.paths[event.wd], event.name)
+            if event.mask & flags.ISDIR:
+                # 新建或移入的目录，包括其中已有的视频
+                for root, _ in walk(path):
+                    self.add_watch(root)
+                paths.extend(self.list_videos(path))
+            elif is_video(path):
+                paths.append(path)
+        return paths
+
+    @staticmethod
+    def list_videos(top):
+        return [
+            os.path.join(root, name)
+            for root, files in walk(top)
+            for name in files
+            if is_video(name)
+        ]
+
+    def close(self):
+        self.inotify.close()
+
+
+def create_watcher(top, interval=5):
+    if inotify_simple is not None:
+        try:
+            return InotifyWatcher(top)
+        except OSError:  # 非 Linux 或 inotify 实例数达到上限
+            pass
+    return PollingWatcher(top, interval)
+
+
+class Settler(object):
+
+    """ 记录发生变化的文件，返回 settle 秒内未再变化的文件 """
+
+    def __init__(self, settle=10):
+        self.settle = settle
+        self.pending = {}  # {路径: ((大小, 修改时间), 最后一次变化的时间)}
+
+    def add(self, path, now=None):
+        self.pending[path] = (stat_key(path), now or time.time())
+
+    def ready(self, now=None):
+        now = now or time.time()
+        paths = []
+        for path, (key, changed_at) in list(self.pending.items()):
+            new_key = stat_key(path)
+            if new_key is None:
+                del self.pending[path]  # 文件已被删除或移走
+            elif new_key != key:
+                self.pending[path] = (new_key, now)
+            elif now - changed_at >= self.settle:
+                del self.pending[path]
+                paths.append(path)
+        return sorted(paths)
+
+
+def watch(get_subtitles, watcher, settle=10, interval=5):
+
+    """ 把 watcher 报告的、写入完成的视频交给 get_subtitles 处理，直到被中断 """
+
+    settler = Settler(settle)
+    while True:
+        timeout = 1 if settler.pending else interval
+        for path in watcher.changed(timeout):
+            settler.add(path)
+        for path in settler.ready():
+            get_subtitles.process_path(path)
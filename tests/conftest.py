@@ -0,0 +1,153 @@
+import io
+import json
+import os.path
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import pytest
+
+from getsubtitle import ratelimit
+
+fixtures_dir = os.path.join(os.path.dirname(__file__), "fixtures")
+
+video_name = "Game.of.Thrones.S07E01.1080p.WEB.h264-TBS.mkv"
+archive_members = [
+    "Game.of.Thrones.S07E01.1080p.WEB.h264-TBS.简体.srt",
+    "Game.of.Thrones.S07E01.1080p.WEB.h264-TBS.简体.ass",
+    "Game.of.Thrones.S07E01.1080p.WEB.h264-TBS.英文.srt",
+]
+# subhd 拒绝含有不允许字符的关键字时返回的页面
+rejected_page = (
+    "<html><body>The URI you submitted has disallowed characters.</body></html>"
+)
+
+
+def build_archive(members=archive_members):
+    buff = io.BytesIO()
+    with zipfile.ZipFile(buff, "w") as archive:
+        for member in members:
+            archive.writestr(
+                member, ("1\n00:00:01,000 --> 00:00:02,000\n%s\n" % member)
+            )
+    return buff.getvalue()
+
+
+def read_fixture(name):
+    with open(os.path.join(fixtures_dir, name), encoding="utf-8") as f:
+        return f.read()
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+
+    """ 按路径返回录制的站点页面，充当 subhd/zimuzu/zimuku """
+
+    routes = [
+        ("GET", "/subhd/search/", "subhd_search.html"),
+        ("GET", "/subhd/ar0/", "subhd_detail.html"),
+        ("GET", "/zimuzu/search", "zimuzu_search.html"),
+        ("GET", "/zimuzu/subtitle/", "zimuzu_detail.html"),
+        ("GET", "/search", "zimuku_search.html"),
+        ("GET", "/detail/", "zimuku_detail.html"),
+        ("GET", "/dld/", "zimuku_download.html"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, body, content_type="text/html; charset=utf-8", headers=None):
+        if isinstance(body, str):
+            body = body.replace("{base}", self.server.base_url).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self, method):
+        self.server.requests.append((method, self.path))
+        path = urlsplit(self.path).path
+        for prefix, delay in self.server.delays.items():
+            if path.startswith(prefix):
+                time.sleep(delay)
+        if path.startswith("/unavailable"):
+            return self.send_error(503)
+        if method == "POST" and path == "/subhd/ajax/down_ajax":
+            self.rfile.read(int(self.headers["Content-Length"]))
+            url = self.server.base_url + "/files/subhd.zip"
+            body = json.dumps({"success": True, "url": url})
+            return self.send(body, "application/json")
+        if path.startswith("/zimuzu/api/"):
+            url = self.server.base_url + "/files/zimuzu.zip"
+            return self.send(json.dumps({"data": {"info": {"file": url}}}))
+        if path.startswith("/files/") or path.startswith("/download/"):
+            return self.send(
+                self.server.archive,
+                "application/octet-stream",
+                {"Content-Disposition": 'attachment; filename="sub.zip"'},
+            )
+        for route_method, prefix, fixture in self.routes:
+            if method == route_method and path.startswith(prefix):
+                return self.send(read_fixture(fixture))
+        self.send_error(404)
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+
+class SiteServer(ThreadingHTTPServer):
+    def __init__(self):
+        super(SiteServer, self).__init__(("127.0.0.1", 0), SiteHandler)
+        self.base_url = "http://127.0.0.1:%d" % self.server_port
+        self.archive = build_archive()
+        self.requests = []
+        self.delays = {}  # {路径前缀: 响应前等待的秒数}
+
+    def point(self, downloader):
+
+        """ 将下载器的站点地址指向本地服务器 """
+
+        base = self.base_url
+        if downloader.name == "SUBHD":
+            downloader.site_url = base + "/subhd"
+            downloader.search_url = base + "/subhd/search/"
+        elif downloader.name == "ZIMUZU":
+            downloader.site_url = base + "/zimuzu"
+            downloader.search_url = base + "/zimuzu/search?keyword={0}&type=subtitle"
+            downloader.api_url = base + "/zimuzu/api/v1/static/subtitle/detail?"
+        else:
+            downloader.site_url = base
+            downloader.search_url = base + "/search?q="
+        return downloader
+
+
+@pytest.fixture
+def site_server():
+    server = SiteServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def unlimited_buckets(monkeypatch):
+
+    """ 请求本地测试服务器时不限速，各测试的限流状态互不影响 """
+
+    monkeypatch.setattr(
+        ratelimit,
+        "_buckets",
+        {
+            site: ratelimit.TokenBucket(rate=1000, burst=1000)
+            for site in ("SUBHD", "ZIMUZU", "ZIMUKU")
+        },
+    )
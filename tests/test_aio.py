@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from getsubtitle.subhd import SubHDDownloader
+from getsubtitle.utils import get_info_dict, get_keywords
+from getsubtitle.zimuku import ZimukuDownloader
+from getsubtitle.zimuzu import ZimuzuDownloader
+
+aio = pytest.importorskip("getsubtitle.aio")
+pytest.importorskip("aiohttp")
+
+keywords = tuple(
+    get_keywords(get_info_dict("Game.of.Thrones.S07E01.1080p.WEB.h264-TBS"))
+)
+
+expected_subtitles = {
+    "SUBHD": [
+        "[SUBHD]权力的游戏 第七季 第1集 Game.of.Thrones.S07E01",
+        "[SUBHD]权力的游戏 S07E01 中英双语",
+    ],
+    "ZIMUZU": [
+        "[ZMZ]Game.of.Thrones.S07E01.1080p.WEB.h264-TBS",
+        "[ZMZ]Game.of.Thrones.S07E02.1080p.WEB.h264-TBS",
+    ],
+    "ZIMUKU": [
+        "[ZIMUKU]Game.of.Thrones.S07E01.1080p.WEB.h264-TBS",
+        "[ZIMUKU]Game.of.Thrones.S07E01.720p.HDTV.x264-AVS",
+    ],
+}
+
+
+@pytest.mark.parametrize(
+    "downloader_class", [SubHDDownloader, ZimuzuDownloader, ZimukuDownloader]
+)
+def test_sync_downloader(site_server, downloader_class):
+    downloader = site_server.point(downloader_class())
+    subtitles = downloader.get_subtitles(keywords, sub_num=2)
+    assert sorted(s.title for s in subtitles) == sorted(
+        expected_subtitles[downloader.name]
+    )
+
+    subtitle = subtitles[0]
+    if downloader.name == "ZIMUKU":
+        # 详情页只在字幕被选中时解析
+        assert not any("/detail/" in path for _, path in site_server.requests)
+        assert not subtitle.resolved
+        subtitle.resolve()
+        assert subtitle.lan == 5
+        assert subtitles[1].lan is None
+    assert subtitle.download() == (".zip", site_server.archive)
+
+
+async def download_first(downloader, subtitles):
+    return await downloader.download_subtitle(subtitles[0])
+
+
+def test_async_downloaders(site_server):
+    async def run():
+        async with aio.create_session() as session:
+            downloaders = [
+                site_server.point(cls(session, concurrency=2))
+                for cls in [
+                    aio.AsyncSubHDDownloader,
+                    aio.AsyncZimuzuDownloader,
+                    aio.AsyncZimukuDownloader,
+                ]
+            ]
+            results = await asyncio.gather(
+                *[d.get_subtitles(keywords, sub_num=2) for d in downloaders]
+            )
+            downloads = await asyncio.gather(
+                *[
+                    download_first(downloader, subtitles)
+                    for downloader, subtitles in zip(downloaders, results)
+                ]
+            )
+            return downloaders, results, downloads
+
+    downloaders, results, downloads = asyncio.run(run())
+    for downloader, subtitles in zip(downloaders, results):
+        assert sorted(s.title for s in subtitles) == sorted(
+            expected_subtitles[downloader.name]
+        )
+    # 只解析了被下载的字幕
+    assert [s.lan for s in results[2]] == [5, None]
+    assert downloads == [(".zip", site_server.archive)] * 3
+
+
+def test_async_backend_sync_interface(site_server):
+    backend = aio.AsyncBackend(concurrency=2)
+    try:
+        subhd = backend.get_downloader("subhd")
+        site_server.point(subhd.downloader)
+        # 只创建用到的下载器
+        assert list(backend.downloaders) == ["subhd"]
+        subtitles = subhd.get_subtitles(keywords, sub_num=2)
+        assert sorted(s.title for s in subtitles) == sorted(expected_subtitles["SUBHD"])
+        assert subtitles[0].download() == (".zip", site_server.archive)
+    finally:
+        backend.close()
+
+
+@pytest.mark.parametrize(
+    "downloader_class", [SubHDDownloader, ZimuzuDownloader, ZimukuDownloader]
+)
+def test_parallel_ladder(site_server, downloader_class):
+    serial = site_server.point(downloader_class())
+    parallel = site_server.point(downloader_class())
+    parallel.parallel_ladder = True
+    assert [s.title for s in parallel.get_subtitles(keywords, sub_num=2)] == [
+        s.title for s in serial.get_subtitles(keywords, sub_num=2)
+    ]
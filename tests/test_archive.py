@@ -0,0 +1,79 @@
+import archi
+
+from getsubtitle.archive import (
+    extract_season,
+    extract_subtitle,
+    list_members,
+    read_members,
+)
+from getsubtitle.utils import get_info_dict
+
+from conftest import archive_members, build_archive, video_name
+
+
+class SpyEntry(object):
+    def __init__(self, entry, read_names):
+        self.filename = entry.filename
+        self._entry = entry
+        self._read_names = read_names
+
+    def read(self):
+        self._read_names.append(self.filename)
+        return self._entry.read()
+
+
+def test_read_members_only_reads_requested(monkeypatch):
+    archive = build_archive()
+    assert list_members(archive) == archive_members
+
+    read_names = []
+    archive_class = archi.Archive
+    monkeypatch.setattr(
+        archi,
+        "Archive",
+        lambda f: (SpyEntry(one, read_names) for one in archive_class(f)),
+    )
+    files = read_members(archive, archive_members[1:2])
+    assert list(files) == archive_members[1:2]
+    assert read_names == archive_members[1:2]
+
+
+def test_extract_subtitle_with_both(tmp_path):
+    extracted = extract_subtitle(
+        video_name,
+        str(tmp_path),
+        "[SUBHD]Game of Thrones",
+        build_archive(),
+        get_info_dict(video_name),
+        rename=True,
+        single=False,
+        both=True,
+        plex=False,
+    )
+    assert [sub_type for _, sub_type in extracted] == [".ass", ".srt"]
+    for member, sub_type in extracted:
+        subtitle = tmp_path / ("Game.of.Thrones.S07E01.1080p.WEB.h264-TBS" + sub_type)
+        assert member in subtitle.read_text()
+
+
+def test_extract_season_matches_episodes(tmp_path):
+    names = [
+        "Game.of.Thrones.S07E%02d.1080p.WEB.h264-TBS.mkv" % episode
+        for episode in range(1, 4)
+    ]
+    archive = build_archive([name.replace(".mkv", ".简体.ass") for name in names[:2]])
+    extracted = extract_season(
+        [(name, str(tmp_path), get_info_dict(name)) for name in names],
+        archive,
+        rename=True,
+        both=False,
+        plex=False,
+    )
+    assert [subs and subs[0][0] for subs in extracted] == [
+        names[0].replace(".mkv", ".简体.ass"),
+        names[1].replace(".mkv", ".简体.ass"),
+        None,
+    ]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        name.replace(".mkv", ".ass") for name in names[:2]
+    ]
@@ -0,0 +1,84 @@
+import time
+
+from getsubtitle.cache import NegativeCache, SearchCache
+from getsubtitle.subhd import SubHDDownloader
+from getsubtitle.utils import get_info_dict, get_keywords
+from getsubtitle.zimuku import ZimukuDownloader
+
+results = [["[SUBHD]a", {"lan": 4, "link": "https://subhd.tv/ar0/1"}]]
+
+
+def test_search_cache_hit_and_miss(tmp_path):
+    cache = SearchCache(str(tmp_path / "search.sqlite3"))
+    assert cache.get("SUBHD", "a s01 ") is None
+    cache.set("SUBHD", "a s01 ", results)
+    assert cache.get("SUBHD", "a s01 ") == [tuple(one) for one in results]
+    assert cache.get("ZIMUZU", "a s01 ") is None
+    assert cache.stats() == {"hits": 1, "misses": 2, "entries": 1}
+
+
+def test_search_cache_ttl(tmp_path):
+    cache = SearchCache(str(tmp_path / "search.sqlite3"), ttl=-1)
+    cache.set("SUBHD", "a", results)
+    assert cache.get("SUBHD", "a") is None
+
+
+def test_search_cache_lru_eviction(tmp_path):
+    cache = SearchCache(str(tmp_path / "search.sqlite3"), max_entries=2)
+    cache.set("SUBHD", "a", results)
+    cache.set("SUBHD", "b", results)
+    cache.get("SUBHD", "a")  # b 成为最久未使用的条目
+    cache.set("SUBHD", "c", results)
+    assert len(cache) == 2
+    assert cache.get("SUBHD", "b") is None
+    assert cache.get("SUBHD", "a") is not None
+
+
+def test_downloader_skips_network_on_cache_hit(site_server, tmp_path):
+    cache = SearchCache(str(tmp_path / "search.sqlite3"))
+    downloader = site_server.point(SubHDDownloader(cache=cache))
+    info_dict = get_info_dict("Game.of.Thrones.S07E01.1080p.WEB.h264-TBS.mkv")
+    keywords = tuple(get_keywords(info_dict))
+
+    first = downloader.get_subtitles(keywords, sub_num=2)
+    requests_count = len(site_server.requests)
+    second = downloader.get_subtitles(keywords, sub_num=2)
+    assert [s.title for s in second] == [s.title for s in first]
+    assert len(site_server.requests) == requests_count
+    assert cache.hits == 1
+
+
+def test_zimuku_cache_key_includes_filter(site_server, tmp_path):
+    cache = SearchCache(str(tmp_path / "search.sqlite3"))
+    downloader = site_server.point(ZimukuDownloader(cache=cache))
+    info_dict = get_info_dict("Game.of.Thrones.S07E01.1080p.WEB.h264-TBS.mkv")
+    keywords = tuple(get_keywords(info_dict))
+    other = dict(info_dict, year=1990)
+
+    # 同一关键字，年份不同的视频不能复用已过滤的结果
+    assert downloader.search(downloader.session, "a", keywords, other) == []
+    assert len(downloader.search(downloader.session, "a", keywords, info_dict)) == 2
+    assert downloader.search(downloader.session, "a", keywords, other) == []
+    assert cache.hits == 1
+
+
+def test_negative_cache_exponential_backoff(tmp_path):
+    cache = NegativeCache(
+        str(tmp_path / "negative.sqlite3"), backoff=10, max_backoff=25
+    )
+    now = time.time()
+    assert cache.get("a s01 e01", now=now) is None
+    assert cache.failed("a s01 e01", "no search results", now=now) == now + 10
+    assert cache.get("a s01 e01", now=now + 5) == {
+        "failures": 1,
+        "reason": "no search results",
+        "retry": now + 10,
+    }
+    assert cache.get("a s01 e01", now=now + 10) is None
+    assert cache.failed("a s01 e01", "no search results", now=now) == now + 20
+    # 间隔不超过上限
+    assert cache.failed("a s01 e01", "no search results", now=now) == now + 25
+    assert cache.stats() == {"skipped": 1, "backing_off": 1}
+
+    cache.succeeded("a s01 e01")
+    assert cache.get("a s01 e01", now=now) is None
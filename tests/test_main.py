@@ -0,0 +1,254 @@
+import io
+import os
+import sys
+import time
+
+import pytest
+
+from conftest import build_archive, video_name
+from getsubtitle.main import GetSubtitles, get_version, main
+from getsubtitle.sys_global_var import prefix
+from getsubtitle.utils import get_info_dict, get_keywords
+from getsubtitle.zimuku import ZimukuDownloader
+
+
+def create(downloader, name="a.mkv", **kwargs):
+    kwargs.setdefault("sub_num", None)
+    return GetSubtitles(
+        name,
+        False,
+        False,
+        False,
+        False,
+        False,
+        False,
+        False,
+        downloader=downloader,
+        sub_path=None,
+        **kwargs
+    )
+
+
+def test_downloaders_are_created_on_demand(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    get_subtitles = create("zimuku", parallel_ladder=True)
+    assert get_subtitles._downloaders == {}
+    downloaders = get_subtitles.downloader
+    assert len(downloaders) == 1
+    assert isinstance(downloaders[0], ZimukuDownloader)
+    assert downloaders[0].parallel_ladder
+    assert get_subtitles.zimuku is downloaders[0]
+    assert list(get_subtitles._downloaders) == ["zimuku"]
+
+
+def test_version_is_printed_to_stdout(monkeypatch):
+    stdout, stderr = io.StringIO(), io.StringIO()
+    monkeypatch.setattr(sys, "stdout", stdout)
+    monkeypatch.setattr(sys, "stderr", stderr)
+    monkeypatch.setattr(sys, "argv", ["getsubtitle", "--version"])
+    with pytest.raises(SystemExit) as exc_info:
+        main()
+    assert exc_info.value.code == 0
+    assert stdout.getvalue() == "getsubtitle %s\n" % get_version()
+    assert stderr.getvalue() == ""
+
+
+def test_unknown_downloader(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    with pytest.raises(ValueError):
+        create("shooter")
+
+
+def test_asyncio_backend_without_aiohttp(tmp_path, monkeypatch):
+    from getsubtitle import aio
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setattr(aio, "aiohttp", None)
+    with pytest.raises(RuntimeError, match=r"getsubtitle\[async\]"):
+        create("zimuku", backend="asyncio")
+
+
+def test_asyncio_backend_starts_with_the_first_downloader(tmp_path, monkeypatch):
+    pytest.importorskip("aiohttp")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    get_subtitles = create("zimuku", backend="asyncio")
+    # 预解析视频名时还没有事件循环线程
+    assert get_subtitles.backend is None
+    assert get_subtitles.zimuku.downloader.name == "ZIMUKU"
+    assert get_subtitles.backend.thread.is_alive()
+    get_subtitles.backend.close()
+
+
+def test_only_the_chosen_subtitle_is_resolved(site_server, tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    video = tmp_path / video_name
+    video.write_bytes(b"video")
+    get_subtitles = create("zimuku")
+    site_server.point(get_subtitles.zimuku)
+    get_subtitles.process_video(
+        video_name, get_subtitles.get_video_info(str(video), "")
+    )
+    assert get_subtitles.failed_list == []
+    assert len([path for _, path in site_server.requests if "/detail/" in path]) == 1
+    assert sorted(p.name for p in tmp_path.iterdir() if p.suffix == ".ass") == [
+        os.path.splitext(video_name)[0] + ".ass"
+    ]
+
+
+def test_season_pack_is_downloaded_once(site_server, tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    library = tmp_path / "library"
+    library.mkdir()
+    names = [video_name.replace("E01", "E%02d" % episode) for episode in (3, 1, 2)]
+    for name in names:
+        (library / name).write_bytes(b"video")
+    site_server.archive = build_archive(
+        [name.replace(".mkv", ".简体.ass") for name in names]
+    )
+    get_subtitles = create("zimuku", str(library), season_pack=True)
+    site_server.point(get_subtitles.zimuku)
+    result = get_subtitles.start()
+    assert (result["success"], result["fail"]) == (3, 0)
+    # 只搜索第一集，其余各集的字幕来自同一个字幕包
+    searches = [path for _, path in site_server.requests if "/search" in path]
+    assert not [path for path in searches if "e02" in path or "e03" in path]
+    assert len([path for _, path in site_server.requests if "/download/" in path]) == 1
+    assert sorted(p.name for p in library.iterdir() if p.suffix == ".ass") == sorted(
+        name.replace(".mkv", ".ass") for name in names
+    )
+
+
+def test_jobs_keep_each_videos_output_together(site_server, tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    library = tmp_path / "library"
+    library.mkdir()
+    names = [video_name.replace("E01", "E%02d" % episode) for episode in (1, 2, 3)]
+    for name in names:
+        (library / name).write_bytes(b"video")
+    get_subtitles = create("zimuku", str(library), jobs=3)
+    site_server.point(get_subtitles.zimuku)
+    site_server.delays["/search"] = 0.05  # 让各视频的搜索交错进行
+    stdout = io.StringIO()
+    monkeypatch.setattr(sys, "stdout", stdout)
+    result = get_subtitles.start()
+    assert (result["success"], result["fail"]) == (1, 2)
+
+    output = stdout.getvalue().split("=====")[0]
+    assert "Searching" not in output
+    blocks = {}
+    for block in output.split("\n\n"):
+        lines = block.splitlines()
+        if lines and lines[0].endswith(".mkv"):
+            blocks[lines[0][len(prefix) + 1 :]] = lines[1:]
+    assert sorted(blocks) == names
+    for name, lines in blocks.items():
+        assert lines[:2] == [prefix + " " + str(library), prefix]
+        if "E01" in name:
+            assert lines[2:] == [prefix + " " + name.replace(".mkv", ".简体.ass")]
+        else:
+            assert len(lines) == 3 and lines[2].startswith(prefix + " error:")
+
+
+def test_search_stops_remaining_sites(site_server, tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    get_subtitles = create(None, sub_num=1)
+    for downloader in get_subtitles.downloader:
+        site_server.point(downloader)
+    site_server.delays.update({"/zimuzu/search": 0.3, "/search": 0.3})
+    info_dict = get_info_dict(video_name)
+    subtitles = get_subtitles.search_subtitles(get_keywords(info_dict), info_dict)
+    assert [subtitle.source.name for subtitle in subtitles] == ["SUBHD"]
+
+    time.sleep(1)  # 等待正在进行的请求结束
+    for path in ("/zimuzu/search", "/search"):
+        searches = [p for _, p in site_server.requests if p.startswith(path)]
+        # 关键字序列中其余的关键字不再搜索
+        assert len(searches) == 1
+
+
+def test_watch_records_errors_and_keeps_going(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    video = tmp_path / video_name
+    video.write_bytes(b"video")
+    get_subtitles = create("zimuku")
+    # 连接被拒绝的地址
+    get_subtitles.zimuku.search_url = "http://127.0.0.1:1/search?q="
+    get_subtitles.process_path(str(video))
+    assert len(get_subtitles.failed_list) == 1
+    assert "network" in get_subtitles.failed_list[0]["error"]
+    # 网络错误不进入退避
+    assert get_subtitles.negative_cache.stats()["backing_off"] == 0
+
+    def fail(video_filename, video_info):
+        raise OSError("disk gone")
+
+    monkeypatch.setattr(get_subtitles, "process_video", fail)
+    get_subtitles.process_path(str(video))
+    assert get_subtitles.failed_list[1]["error"] == "OSError: disk gone"
+
+
+def test_watch_sees_videos_written_during_the_first_pass(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    get_subtitles = create("zimuku", str(tmp_path))
+    video = tmp_path / video_name
+
+    def start():
+        # 处理已有视频期间，新视频写入完成
+        video.write_bytes(b"video")
+
+    def process_path(path):
+        processed.append(path)
+        raise KeyboardInterrupt
+
+    processed = []
+    monkeypatch.setattr(get_subtitles, "start", start)
+    monkeypatch.setattr(get_subtitles, "process_path", process_path)
+    get_subtitles.watch(settle=0, interval=0)
+    assert processed == [str(video)]
+
+
+@pytest.mark.parametrize("failure", ["verification", "download"])
+def test_transient_failures_are_not_backed_off(
+    site_server, tmp_path, monkeypatch, failure
+):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    video = tmp_path / video_name
+    video.write_bytes(b"video")
+    get_subtitles = create("zimuku")
+    zimuku = site_server.point(get_subtitles.zimuku)
+    zimuku.bucket.cooldown = zimuku.max_retries = 0
+    if failure == "verification":
+        monkeypatch.setattr(zimuku, "parse_search", lambda *args, **kwargs: None)
+    else:
+        monkeypatch.setattr(zimuku, "download_subtitle", lambda subtitle: None)
+    get_subtitles.process_video(
+        video_name, get_subtitles.get_video_info(str(video), "")
+    )
+    assert "try again later" in get_subtitles.failed_list[0]["error"]
+    assert get_subtitles.negative_cache.stats()["backing_off"] == 0
+
+
+def test_season_pack_without_the_current_episode(site_server, tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    library = tmp_path / "library"
+    library.mkdir()
+    names = [video_name.replace("E01", "E%02d" % episode) for episode in (1, 2, 3)]
+    for name in names:
+        (library / name).write_bytes(b"video")
+    # 字幕包中没有第一集
+    site_server.archive = build_archive(
+        [name.replace(".mkv", ".简体.ass") for name in names[1:]]
+    )
+    get_subtitles = create("zimuku", str(library), season_pack=True)
+    site_server.point(get_subtitles.zimuku)
+    result = get_subtitles.start()
+    assert [one["name"] for one in result["fail_videos"]] == names[:1]
+    assert len([path for _, path in site_server.requests if "/download/" in path]) == 1
+    assert sorted(p.name for p in library.iterdir() if p.suffix == ".ass") == [
+        name.replace(".mkv", ".ass") for name in names[1:]
+    ]
+    # 分到字幕的视频已记录，再次运行时直接跳过
+    for name in names[1:]:
+        assert get_subtitles.library_state.get(str(library / name))["outcome"] == (
+            "success"
+        )
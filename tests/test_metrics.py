@@ -0,0 +1,43 @@
+import json
+
+from getsubtitle.metrics import Histogram, Metrics
+from getsubtitle.metrics import metrics as global_metrics
+from getsubtitle.subhd import SubHDDownloader
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(value)
+    assert histogram.to_dict() == {
+        "count": 4,
+        "sum": 4.25,
+        "buckets": {"0.1": 1, "1": 3, "+Inf": 4},
+    }
+
+
+def test_metrics_report_and_outputs(tmp_path):
+    metrics = Metrics()
+    with metrics.timer("search", "SUBHD"):
+        pass
+    metrics.inc("requests", "SUBHD")
+    metrics.inc("bytes", "SUBHD", 1024)
+    report = metrics.report()
+    assert report["timers"]["search"]["SUBHD"]["count"] == 1
+    assert report["counters"] == {"bytes": {"SUBHD": 1024}, "requests": {"SUBHD": 1}}
+
+    metrics.write_json(str(tmp_path / "metrics.json"), report)
+    assert json.loads((tmp_path / "metrics.json").read_text()) == report
+    metrics.write_prometheus(str(tmp_path / "metrics.prom"), report)
+    text = (tmp_path / "metrics.prom").read_text()
+    assert 'getsubtitle_stage_seconds_count{stage="search",site="SUBHD"} 1' in text
+    assert 'getsubtitle_bytes_total{site="SUBHD"} 1024' in text
+
+
+def test_downloader_records_requests_and_search_time(site_server):
+    global_metrics.clear()
+    downloader = site_server.point(SubHDDownloader())
+    downloader.search(downloader.session, "Game of Thrones s07", ())
+    report = global_metrics.report()
+    assert report["counters"]["requests"]["SUBHD"] == 1
+    assert report["timers"]["search"]["SUBHD"]["count"] == 1
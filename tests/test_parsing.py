@@ -0,0 +1,57 @@
+import pytest
+
+from conftest import read_fixture, rejected_page
+from getsubtitle import parsing
+from getsubtitle.downloader import SearchRejected
+from getsubtitle.subhd import SubHDDownloader
+from getsubtitle.zimuku import ZimukuDownloader
+from getsubtitle.zimuzu import ZimuzuDownloader
+
+keywords = ("Game of Thrones", "s07", "e01")
+
+
+@pytest.fixture(params=["lxml", "html.parser"])
+def parser(request, monkeypatch):
+    monkeypatch.setattr(parsing, "parser", request.param)
+    return request.param
+
+
+def test_subhd_pages(parser):
+    downloader = SubHDDownloader()
+    results = downloader.parse_search(read_fixture("subhd_search.html"), keywords)
+    assert [name for name, _ in results] == [
+        "[SUBHD]权力的游戏 第七季 第1集 Game.of.Thrones.S07E01",
+        "[SUBHD]权力的游戏 S07E01 中英双语",
+    ]
+    assert results[1][1]["version"] == "Game.of.Thrones.S07E01.720p.HDTV.x264-AVS"
+    assert downloader.parse_search("<html><body></body></html>", keywords) is None
+    with pytest.raises(SearchRejected):
+        downloader.parse_search(rejected_page, keywords)
+    assert downloader.parse_dtoken(read_fixture("subhd_detail.html")) == "c7a5f4c2e1"
+
+
+def test_zimuzu_pages(parser):
+    downloader = ZimuzuDownloader()
+    results = downloader.parse_search(read_fixture("zimuzu_search.html"), keywords)
+    assert [payload["version"] for _, payload in results] == [
+        "Game.of.Thrones.S07E01.1080p.WEB.h264-TBS",
+        "Game.of.Thrones.S07E02.1080p.WEB.h264-TBS",
+    ]
+    assert downloader.parse_detail(read_fixture("zimuzu_detail.html")).endswith(
+        "/zimuzu/download?code=8d1f0a"
+    )
+
+
+def test_zimuku_pages(parser):
+    downloader = ZimukuDownloader()
+    results = downloader.parse_search(read_fixture("zimuku_search.html"), keywords)
+    assert [payload["link"] for _, payload in results] == [
+        "http://www.zimuku.la/detail/93041.html",
+        "http://www.zimuku.la/detail/93042.html",
+    ]
+    assert downloader.parse_detail(read_fixture("zimuku_detail.html"), "default") == (
+        5,
+        "/dld/93041.html",
+    )
+    download_page = read_fixture("zimuku_download.html")
+    assert downloader.parse_download_page(download_page) == "/download/MTAwMzE2fDI4ZmI4"
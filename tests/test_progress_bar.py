@@ -0,0 +1,81 @@
+import io
+import os
+import sys
+from collections import namedtuple
+
+import pytest
+
+from getsubtitle import progress_bar
+from getsubtitle.output import ThreadBufferedStream
+from getsubtitle.progress_bar import ProgressBar, board
+
+
+class FakeTerminal(io.StringIO):
+    def isatty(self):
+        return True
+
+
+@pytest.fixture
+def terminal(monkeypatch):
+    sizes = []
+
+    def get_terminal_size():
+        sizes.append(1)
+        return os.terminal_size((60, 24))
+
+    monkeypatch.setattr(progress_bar, "get_terminal_size", get_terminal_size)
+    monkeypatch.setattr(progress_bar, "_width", {"columns": 80, "checked": None})
+    monkeypatch.setattr(board, "bars", [])
+    monkeypatch.setattr(board, "shown", 0)
+    monkeypatch.setattr(board, "painted", 0.0)
+    # pytest 在测试开始时重新设置 sys.stdout，由测试自行替换
+    return namedtuple("Terminal", "stream sizes")(FakeTerminal(), sizes)
+
+
+def test_no_output_when_not_a_tty(monkeypatch):
+    stream = io.StringIO()
+    monkeypatch.setattr(sys, "stdout", stream)
+    bar = ProgressBar("Get", "a.zip", 100)
+    for i in range(101):
+        bar.refresh(i)
+    assert stream.getvalue() == ""
+    assert board.bars == []
+
+
+def test_repaints_are_throttled(terminal, monkeypatch):
+    monkeypatch.setattr(sys, "stdout", terminal.stream)
+    bar = ProgressBar("Get", "a.zip", 10000)
+    for i in range(1, 10001):
+        bar.refresh(i)
+    lines = terminal.stream.getvalue().split("\r")
+    # 第一次刷新、清除状态行、最终状态各一次
+    assert len(lines) <= 4
+    assert lines[-1] == "Get 'a.zip'...  100.00%\n"
+    assert len(terminal.sizes) == 1
+    assert board.bars == []
+
+
+def test_long_title_is_truncated(terminal, monkeypatch):
+    monkeypatch.setattr(sys, "stdout", terminal.stream)
+    bar = ProgressBar("Get", "x" * 200, 100)
+    bar.refresh(100)
+    line = terminal.stream.getvalue().strip()
+    assert len(line) <= 59
+    assert line.endswith("...  100.00%")
+
+
+def test_concurrent_downloads_share_one_line(terminal, monkeypatch):
+    stream = ThreadBufferedStream(terminal.stream)
+    monkeypatch.setattr(sys, "stdout", stream)
+    first = ProgressBar("Get", "a.zip", 100)
+    second = ProgressBar("Get", "b.zip")
+    with stream.buffered():
+        first.refresh(10)
+        second.point_wait()
+        board.update(force=True)
+        assert terminal.stream.getvalue().endswith("Get 2 files: a.zip 10% | b.zip .")
+        first.refresh(100)
+        second.close()
+    # 最终状态随线程缓冲整块写出，状态行已被清除
+    assert terminal.stream.getvalue().endswith("\rGet 'a.zip'...  100.00%\n")
+    assert board.bars == []
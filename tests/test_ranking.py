@@ -0,0 +1,73 @@
+from conftest import archive_members, video_name
+from getsubtitle.models import Subtitle
+from getsubtitle.ranking import Ranker, language_value
+from getsubtitle.utils import get_best_subtitle, get_info_dict
+
+
+def test_language_value():
+    assert language_value("简体&英文 ENG") == 3
+    assert language_value("繁体") == language_value("cht") == 4
+    assert language_value("CHT") == 0
+    assert language_value("中英文 eng") == 10
+    assert language_value("") == 0
+
+
+def test_rank_subtitles_across_sites():
+    ranker = Ranker(get_info_dict(video_name))
+    subtitles = [
+        Subtitle("[SUBHD]a 720p", "a", 4, "1"),
+        Subtitle("[ZMZ]b", "Game.of.Thrones.S07E01.1080p.WEB.h264-TBS", 4, "2"),
+        Subtitle("[SUBHD]c", "c", 8, "3"),
+        Subtitle("[ZIMUKU]d 简体", "d", None, "4"),
+        Subtitle("[ZIMUKU]e", "e", None, "5"),
+    ]
+    ranked = ranker.rank_subtitles(subtitles)
+    # 双语优先，语言相同时与视频压制组、分辨率一致的优先，其余保持原有顺序
+    assert [s.link for s in ranked] == ["3", "2", "1", "4", "5"]
+    assert ranker.rank_subtitles(subtitles, 2) == ranked[:2]
+
+
+def test_best_archive_member():
+    ranker = Ranker()
+    assert [name for _, name in ranker.iter_members(archive_members)] == [
+        archive_members[1],
+        archive_members[0],
+        archive_members[2],
+    ]
+    assert get_best_subtitle(archive_members, get_info_dict(video_name)) == (
+        archive_members[1]
+    )
+
+
+def substring_score(filename):
+    score = sum(
+        value * (token in filename)
+        for token, value in [
+            ("英文", 1),
+            ("eng", 1),
+            ("简体", 2),
+            ("chs", 2),
+            ("cht", 4),
+            ("繁体", 4),
+            ("中英", 8),
+        ]
+    )
+    score += ("ass" in filename or "ssa" in filename) * 2
+    score += ("srt" in filename) * 1
+    return score
+
+
+def test_member_score_matches_substring_scoring():
+    names = [
+        "a.中英文.ass",
+        "a.简体&英文.srt",
+        "a.chs.eng.ssa.ass",
+        "a.CHS.ENG.srt",
+        "Class.S01E01.繁体.srt",
+        "a.cht&chs.txt",
+        "",
+    ]
+    ranker = Ranker(get_info_dict(video_name))
+    assert [ranker.member_score(name) for name in names] == [
+        substring_score(name) for name in names
+    ]
@@ -0,0 +1,67 @@
+import pytest
+
+from getsubtitle.downloader import SearchBlocked
+from getsubtitle.ratelimit import TokenBucket, get_bucket
+from getsubtitle.sessions import create_session
+from getsubtitle.subhd import SubHDDownloader
+
+from conftest import rejected_page
+
+
+def test_token_bucket_allows_burst_then_paces():
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    delay = bucket.reserve()
+    assert 0.05 < delay <= 0.1
+
+
+def test_token_bucket_backs_off_when_throttled():
+    bucket = TokenBucket(rate=10, burst=2, min_rate=1, cooldown=5)
+    bucket.throttled()
+    assert bucket.rate == 5
+    assert bucket.reserve() >= 5  # 冷却期间暂停请求
+    bucket.succeeded()
+    assert bucket.rate == 6
+    assert bucket.stats()["throttles"] == 1
+
+
+def test_get_bucket_is_shared_per_site():
+    assert get_bucket("TEST") is get_bucket("TEST", rate=1)
+    assert get_bucket("TEST") is not get_bucket("OTHER")
+
+
+def test_search_retries_are_bounded(site_server):
+    class VerifyingSubHD(SubHDDownloader):
+        def parse_search(self, text, keywords, info_dict=None):
+            return None  # 总是返回验证页面
+
+    downloader = site_server.point(VerifyingSubHD())
+    downloader.bucket.cooldown = 0
+    assert downloader.search(downloader.session, "a", ("a",)) is None
+    assert len(site_server.requests) == downloader.max_retries + 1
+    assert downloader.bucket.throttles == downloader.max_retries + 1
+    # 没有任何搜索结果时不当作没有字幕
+    with pytest.raises(SearchBlocked):
+        downloader.get_subtitles(("a",))
+
+
+def test_rejected_keyword_stops_the_ladder(site_server):
+    class RejectingSubHD(SubHDDownloader):
+        def parse_search(self, text, keywords, info_dict=None):
+            return super(RejectingSubHD, self).parse_search(
+                rejected_page, keywords, info_dict
+            )
+
+    downloader = site_server.point(RejectingSubHD())
+    assert downloader.get_subtitles(("a", "s01", "e01")) == []
+    assert len(site_server.requests) == 1
+
+
+def test_unavailable_is_not_retried_before_the_bucket_sees_it(site_server):
+    bucket = TokenBucket(rate=1000, burst=10, cooldown=0)
+    session = create_session(bucket=bucket, backoff_factor=0)
+    response = session.get(site_server.base_url + "/unavailable", timeout=10)
+    assert response.status_code == 503
+    assert len(site_server.requests) == 1
+    assert bucket.throttles == 1
@@ -0,0 +1,41 @@
+import os
+
+from getsubtitle.scanner import scan_videos, sidecar_index, walk
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "w").close()
+
+
+def test_walk_matches_os_walk(tmp_path):
+    for name in ["a/1.mkv", "a/b/2.mkv", "a/b/c/3.mp4", "d/4.avi", "5.mkv"]:
+        touch(str(tmp_path / name))
+    expected = [(root, sorted(files)) for root, _, files in os.walk(str(tmp_path))]
+    result = [(root, sorted(files)) for root, files in walk(str(tmp_path), 4)]
+    assert sorted(result) == sorted(expected)
+
+
+def test_sidecar_index():
+    names = ["a.mkv", "a.srt", "b.zh.ass", "c.txt"]
+    assert sidecar_index(names) == {"a", "b", "b.zh"}
+
+
+def test_scan_videos(tmp_path):
+    library, store = tmp_path / "library", tmp_path / "store"
+    for name in ["S01/ep1.mkv", "S01/ep1.srt", "S01/ep2.mkv", "S02/ep3.mp4"]:
+        touch(str(library / name))
+    touch(str(store / "ep2.zh.ass"))
+
+    video_dict = scan_videos(str(library))
+    assert video_dict["ep1.mkv"] == {
+        "path": str(library / "S01"),
+        "have_subtitle": 1,
+        "video_path": str(library / "S01" / "ep1.mkv"),
+    }
+    assert video_dict["ep2.mkv"]["have_subtitle"] == 0
+    assert video_dict["ep3.mp4"]["have_subtitle"] == 0
+
+    video_dict = scan_videos(str(library), str(store))
+    assert video_dict["ep2.mkv"]["path"] == str(store)
+    assert video_dict["ep2.mkv"]["have_subtitle"] == 1
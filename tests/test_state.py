@@ -0,0 +1,41 @@
+import os
+
+from getsubtitle.state import LibraryState
+from getsubtitle.utils import get_info_dict
+
+
+def test_library_state_skips_unchanged_videos(tmp_path):
+    video = tmp_path / "Game.of.Thrones.S07E01.1080p.WEB.h264-TBS.mkv"
+    video.write_bytes(b"video")
+    video_path = str(video)
+    state = LibraryState(str(tmp_path / "library.sqlite3"))
+    stat = state.stat(video_path)
+    assert not state.is_finished(video_path, stat)
+
+    state.record(
+        video_path,
+        stat,
+        "success",
+        info=get_info_dict(video.name),
+        subtitle="[SUBHD]权力的游戏 S07E01 中英双语",
+        site="SUBHD",
+    )
+    record = state.get(video_path)
+    assert record["info"]["episode"] == 1
+    assert (record["site"], record["outcome"]) == ("SUBHD", "success")
+    assert state.is_finished(video_path, state.stat(video_path))
+
+    # 文件被替换后重新处理
+    video.write_bytes(b"new video")
+    os.utime(video_path, (1, 1))
+    assert not state.is_finished(video_path, state.stat(video_path))
+    assert state.stats() == {"skipped": 1, "recorded": 1, "entries": 1}
+
+
+def test_library_state_retries_failed_videos(tmp_path):
+    video = tmp_path / "video.mkv"
+    video.write_bytes(b"video")
+    state = LibraryState(str(tmp_path / "library.sqlite3"))
+    stat = state.stat(str(video))
+    state.record(str(video), stat, "failed", error="no search results. ")
+    assert not state.is_finished(str(video), stat)
@@ -0,0 +1,29 @@
+from getsubtitle.store import ArchiveStore
+
+
+def test_archive_store_roundtrip(tmp_path):
+    store = ArchiveStore(str(tmp_path))
+    assert store.get("https://subhd.tv/ar0/1") is None
+    sha256 = store.put("https://subhd.tv/ar0/1", ".zip", b"archive")
+    assert store.get("https://subhd.tv/ar0/1") == (".zip", b"archive")
+    assert store.get_by_hash(sha256) == (".zip", b"archive")
+    assert store.stats() == {"hits": 1, "misses": 1, "size": len(b"archive")}
+
+
+def test_archive_store_deduplicates_content(tmp_path):
+    store = ArchiveStore(str(tmp_path))
+    first = store.put("http://www.zimuku.la/download/1", ".rar", b"same")
+    second = store.put("http://www.zimuku.la/download/2", ".rar", b"same")
+    assert first == second
+    assert store.size() == len(b"same")
+
+
+def test_archive_store_evicts_least_recently_used(tmp_path):
+    store = ArchiveStore(str(tmp_path), max_size=10)
+    store.put("a", ".zip", b"aaaa")
+    store.put("b", ".zip", b"bbbb")
+    store.get("a")  # b 成为最久未使用的压缩包
+    store.put("c", ".zip", b"cccc")
+    assert store.get("b") is None
+    assert store.get("a") == (".zip", b"aaaa")
+    assert store.size() == 8
@@ -1,8 +1,15 @@
+import threading
 from typing import List
 
 import pytest
 
-from getsubtitle.utils import get_info_dict, get_keywords
+from getsubtitle.utils import (
+    get_info_dict,
+    get_keywords,
+    info_cache,
+    preparse,
+    season_match,
+)
 
 
 @pytest.mark.parametrize(
@@ -23,3 +30,59 @@ def test_get_keywords(filename: str, must_includes: List[str]):
                 break
         else:
             raise Exception(f"not include: {must_include}", keywords)
+
+
+def test_get_info_dict_is_cached_and_frozen():
+    filename = "Game.of.Thrones.S07E01.1080p.WEB.h264-TBS.mkv"
+    info_cache.clear()
+    info_dict = get_info_dict(filename)
+    assert get_info_dict("[" + filename + "]") == info_dict
+    assert info_cache.stats()["hits"] == 1
+    with pytest.raises(TypeError):
+        info_dict["title"] = "changed"
+
+
+def test_preparse_fills_info_cache():
+    names = [
+        "Game.of.Thrones.S07E%02d.1080p.WEB.h264-TBS.mkv" % episode
+        for episode in range(1, 5)
+    ]
+    info_cache.clear()
+    expected = [dict(get_info_dict(name)) for name in names]
+    info_cache.clear()
+    assert preparse(names + names[:1], workers=2, chunk_size=2) == 4
+    assert [dict(get_info_dict(name)) for name in names] == expected
+    assert info_cache.stats()["misses"] == 0
+    # 已缓存的名称不再解析
+    assert preparse(names, workers=2, chunk_size=2) == 0
+
+
+@pytest.mark.parametrize(
+    "name,matched",
+    [
+        ["Game.of.Thrones.S07.1080p.WEB.h264-TBS", True],
+        ["Game.of.Thrones.S07E01-E03.1080p.WEB.h264-TBS", True],
+        ["Game.of.Thrones.S07E02.1080p.WEB.h264-TBS", True],
+        ["Game.of.Thrones.S07E01.1080p.WEB.h264-TBS", False],
+        ["Game.of.Thrones.S06.1080p.WEB.h264-TBS", False],
+    ],
+)
+def test_season_match(name: str, matched: bool):
+    video = "Game.of.Thrones.S07E02.1080p.WEB.h264-TBS.mkv"
+    assert season_match(name, video) == matched
+
+
+def test_preparse_with_other_threads_running():
+    names = [
+        "Game.of.Thrones.S07E%02d.1080p.WEB.h264-TBS.mkv" % episode
+        for episode in range(1, 5)
+    ]
+    info_cache.clear()
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        assert preparse(names, workers=2, chunk_size=2) == 4
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,47 @@
+from getsubtitle.watch import PollingWatcher, Settler, create_watcher
+
+
+def test_polling_watcher_reports_new_and_changed_videos(tmp_path):
+    (tmp_path / "old.mkv").write_bytes(b"old")
+    watcher = PollingWatcher(str(tmp_path), interval=0)
+    assert watcher.changed(0) == []
+
+    (tmp_path / "Season 01").mkdir()
+    (tmp_path / "Season 01" / "new.mkv").write_bytes(b"new")
+    (tmp_path / "new.srt").write_bytes(b"subtitle")
+    assert watcher.changed(0) == [str(tmp_path / "Season 01" / "new.mkv")]
+
+    (tmp_path / "old.mkv").write_bytes(b"old and longer")
+    assert watcher.changed(0) == [str(tmp_path / "old.mkv")]
+
+
+def test_settler_waits_until_file_stops_changing(tmp_path):
+    video = tmp_path / "video.mkv"
+    video.write_bytes(b"part")
+    settler = Settler(settle=10)
+    settler.add(str(video), now=100)
+    assert settler.ready(now=105) == []
+
+    video.write_bytes(b"partial write")  # 仍在写入，重新计时
+    assert settler.ready(now=108) == []
+    assert settler.ready(now=115) == []
+    assert settler.ready(now=118) == [str(video)]
+    assert settler.pending == {}
+
+
+def test_settler_drops_removed_files(tmp_path):
+    video = tmp_path / "video.mkv"
+    video.write_bytes(b"part")
+    settler = Settler(settle=0)
+    settler.add(str(video))
+    video.unlink()
+    assert settler.ready() == []
+    assert settler.pending == {}
+
+
+def test_create_watcher(tmp_path):
+    watcher = create_watcher(str(tmp_path), interval=0)
+    try:
+        assert watcher.changed(0) == []
+    finally:
+        watcher.close()